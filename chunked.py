@@ -0,0 +1,243 @@
+import time
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+
+import config
+from shared_board import HIDDEN, MARKED, VIRUS, CELL_VALUES
+
+
+class ChunkedBoard:
+    """Virus layout of a board too large to be stored, generated tile by tile from a seed.
+
+    Each cell contains a virus with probability `density`, independently of the others. A tile is always generated the same
+    way, so nothing has to be kept in memory to get it again."""
+    def __init__(self, board_size: int, density: float, seed: int = 0, tile_size: int = 64, cache_size: int = 256):
+        self.board_size = board_size
+        self.density = density
+        self.seed = seed
+        self.tile_size = tile_size
+        self.num_tiles = (board_size + tile_size - 1) // tile_size # Number of tiles in each row and column
+        self.values = lru_cache(maxsize=cache_size)(self.__values) # Recently used tiles are kept to avoid generating them again
+
+    def viruses(self, tile_row: int, tile_col: int) -> np.ndarray:
+        """Return whether each cell of a tile contains a virus. Cells outside the board contain none."""
+        size = self.tile_size
+        if not (0 <= tile_row < self.num_tiles and 0 <= tile_col < self.num_tiles):
+            return np.zeros((size, size), dtype=bool)
+
+        rng = np.random.default_rng([self.seed, tile_row, tile_col])
+        viruses = rng.random((size, size)) < self.density
+        viruses[max(self.board_size - tile_row * size, 0):, :] = False
+        viruses[:, max(self.board_size - tile_col * size, 0):] = False
+        return viruses
+
+    def __values(self, tile_row: int, tile_col: int) -> np.ndarray:
+        """Return the values of the cells of a tile as in `CovidGame.values`: -1 for viruses, otherwise the number of
+        neighbors containing a virus."""
+        size = self.tile_size
+        padded = np.zeros((size + 2, size + 2), dtype=np.int8) # The tile with a border of one cell from the neighbor tiles
+        for row_shift in (-1, 0, 1):
+            for col_shift in (-1, 0, 1):
+                viruses = self.viruses(tile_row + row_shift, tile_col + col_shift)
+                rows = slice(1, size + 1) if row_shift == 0 else (slice(0, 1) if row_shift == -1 else slice(size + 1, size + 2))
+                cols = slice(1, size + 1) if col_shift == 0 else (slice(0, 1) if col_shift == -1 else slice(size + 1, size + 2))
+                source_rows = slice(0, size) if row_shift == 0 else (slice(size - 1, size) if row_shift == -1 else slice(0, 1))
+                source_cols = slice(0, size) if col_shift == 0 else (slice(size - 1, size) if col_shift == -1 else slice(0, 1))
+                padded[rows, cols] = viruses[source_rows, source_cols]
+
+        counts = np.zeros((size, size), dtype=np.int8)
+        for row_shift in (0, 1, 2):
+            for col_shift in (0, 1, 2):
+                if row_shift != 1 or col_shift != 1:
+                    counts += padded[row_shift:row_shift + size, col_shift:col_shift + size]
+
+        counts[padded[1:size + 1, 1:size + 1] == 1] = -1
+        counts.flags.writeable = False # Shared through the cache
+        return counts
+
+
+class ChunkedCovidGame:
+    """A game on a `ChunkedBoard`. Only tiles that have been touched are kept, as arrays of `shared_board` cell codes, and
+    tiles whose safe cells are all revealed are dropped since they can be generated again from the seed.
+
+    It can be passed to `Solver` as `game`. Since the board cannot be read as a whole, the solver reads `window`, the part of
+    the board around the frontier. The game is won once every tile is solved."""
+    def __init__(self, board_size: int, density: float, seed: int = 0, tile_size: int = 64):
+        self.board = ChunkedBoard(board_size, density, seed, tile_size)
+        self.board_size = board_size
+        self.density = density
+        self.num_virus = round(density * board_size * board_size) # Expected number of viruses
+        self.num_virus_left = self.num_virus
+        self.iter = 0
+        self.over = False
+        self.won = False
+        self.changes = [] # Cells changed by the last command as (row, col, value)
+        self.tiles = {} # (tile_row, tile_col) -> codes of the cells of a touched tile
+        self.solved = set() # Tiles whose safe cells are all revealed
+
+    def __tile(self, tile_row: int, tile_col: int) -> np.ndarray:
+        """Return the codes of the cells of a touched or solved tile, creating it on first access."""
+        key = (tile_row, tile_col)
+        if key in self.tiles:
+            return self.tiles[key]
+        if key in self.solved:
+            return self.__solved_codes(tile_row, tile_col)
+
+        size = self.board.tile_size
+        codes = np.full((size, size), HIDDEN, dtype=np.uint8)
+        codes[max(self.board_size - tile_row * size, 0):, :] = 0 # Cells outside the board count as revealed
+        codes[:, max(self.board_size - tile_col * size, 0):] = 0
+        self.tiles[key] = codes
+        return codes
+
+    def __solved_codes(self, tile_row: int, tile_col: int) -> np.ndarray:
+        values = self.board.values(tile_row, tile_col)
+        codes = values.astype(np.uint8)
+        codes[values == -1] = VIRUS if self.won else MARKED # All viruses of a solved tile are known
+        return codes
+
+    def __set(self, row: int, col: int, code: int):
+        size = self.board.tile_size
+        self.__tile(row // size, col // size)[row % size, col % size] = code
+        self.changes.append((row, col, str(CELL_VALUES[code])))
+
+    def __code(self, row: int, col: int) -> int:
+        size = self.board.tile_size
+        return int(self.__tile(row // size, col // size)[row % size, col % size])
+
+    def __value(self, row: int, col: int) -> int:
+        size = self.board.tile_size
+        return int(self.board.values(row // size, col // size)[row % size, col % size])
+
+    def step(self, user_input: list) -> list:
+        """Apply a command in the same format as `CovidGame.step` and return the changed cells."""
+        self.iter += 1
+        self.changes = []
+        try:
+            row, col = int(user_input[0]) - 1, int(user_input[1]) - 1
+        except (ValueError, IndexError):
+            return self.changes
+        if self.over or not (0 <= row < self.board_size and 0 <= col < self.board_size):
+            return self.changes
+        if (row // self.board.tile_size, col // self.board.tile_size) in self.solved: # Nothing left to do there
+            return self.changes
+
+        if len(user_input) == 3:
+            self.__mark(row, col)
+        else:
+            self.__reveal(row, col)
+
+        size = self.board.tile_size
+        if not self.over: # Otherwise the tile showing the revealed virus could be dropped
+            for tile in {(row // size, col // size) for row, col, _ in self.changes}:
+                self.__evict_if_solved(tile)
+        if len(self.solved) == self.board.num_tiles ** 2:
+            self.won = True
+            self.over = True
+        return self.changes
+
+    def __mark(self, row: int, col: int):
+        code = self.__code(row, col)
+        if code == HIDDEN:
+            self.__set(row, col, MARKED)
+            self.num_virus_left -= 1
+        elif code == MARKED:
+            self.__set(row, col, HIDDEN)
+            self.num_virus_left += 1
+
+    def __reveal(self, row: int, col: int):
+        if self.__value(row, col) == -1:
+            self.__set(row, col, VIRUS)
+            self.over = True
+            return
+
+        queue = deque([(row, col)]) # Iterative since the area opened around zeros can be very large
+        while queue:
+            row, col = queue.popleft()
+            if self.__code(row, col) not in (HIDDEN, MARKED):
+                continue
+            value = self.__value(row, col)
+            self.__set(row, col, value)
+            if value != 0:
+                continue
+            for neighbor_row in range(max(row - 1, 0), min(row + 2, self.board_size)):
+                for neighbor_col in range(max(col - 1, 0), min(col + 2, self.board_size)):
+                    queue.append((neighbor_row, neighbor_col))
+
+    def __evict_if_solved(self, tile: tuple):
+        codes = self.tiles.get(tile)
+        if codes is None:
+            return
+        values = self.board.values(*tile)
+        if np.all((values == -1) | (codes <= 8)): # Every safe cell is revealed
+            del self.tiles[tile]
+            self.solved.add(tile)
+
+    def window(self) -> tuple:
+        """Return (row, col, board) where board is the part of the board around the frontier, as a list of rows of cell values
+        like in `CovidGame.to_csv`, and (row, col) is the position of its top left cell.
+
+        The frontier is in the touched tiles that are not solved and in the solved tiles next to them or to untouched tiles.
+        The window covers these tiles and one more tile around them, so every number it shows has all its neighbors in it.
+        Other solved tiles have no unrevealed cell around them, so inside the window they are shown as revealed without
+        being generated again."""
+        num_tiles = self.board.num_tiles
+        active = set(self.tiles)
+        for tile_row, tile_col in self.solved:
+            for row_shift in (-1, 0, 1):
+                for col_shift in (-1, 0, 1):
+                    neighbor = (tile_row + row_shift, tile_col + col_shift)
+                    if 0 <= neighbor[0] < num_tiles and 0 <= neighbor[1] < num_tiles and neighbor not in self.solved:
+                        active.add((tile_row, tile_col))
+        if not active: # Either nothing was touched yet, so start from the middle of the board, or every tile is solved
+            active = self.solved or {(num_tiles // 2, num_tiles // 2)}
+
+        size = self.board.tile_size
+        first_row = max(min(tile_row for tile_row, _ in active) - 1, 0)
+        last_row = min(max(tile_row for tile_row, _ in active) + 1, num_tiles - 1)
+        first_col = max(min(tile_col for _, tile_col in active) - 1, 0)
+        last_col = min(max(tile_col for _, tile_col in active) + 1, num_tiles - 1)
+
+        codes = np.full(((last_row - first_row + 1) * size, (last_col - first_col + 1) * size), HIDDEN, dtype=np.uint8)
+        for tile_row in range(first_row, last_row + 1):
+            for tile_col in range(first_col, last_col + 1):
+                key = (tile_row, tile_col)
+                row, col = (tile_row - first_row) * size, (tile_col - first_col) * size
+                if key in active:
+                    codes[row:row + size, col:col + size] = self.__tile(tile_row, tile_col)
+                elif key in self.solved:
+                    codes[row:row + size, col:col + size] = 0
+
+        height = min((last_row + 1) * size, self.board_size) - first_row * size # Drop cells outside the board
+        width = min((last_col + 1) * size, self.board_size) - first_col * size
+        return first_row * size, first_col * size, CELL_VALUES[codes[:height, :width]].tolist()
+
+
+def main():
+    import solver
+
+    covid_game = ChunkedCovidGame(board_size=config.chunked_board_size, density=config.virus_density,
+                                  seed=config.chunked_seed, tile_size=config.tile_size)
+    start = time.time()
+    try:
+        solver.Solver(game=covid_game,
+                      first_pos=config.first_pos,
+                      use_least_square = config.use_least_square,
+                      use_cp_solver = config.use_cp_solver,
+                      csp_timeout = config.timeout,
+                      min_num_sol_cp_solver = config.min_num_sol_cp_solver,
+                      move_budget = config.move_budget,
+                      use_model_counting = config.use_model_counting,
+                      min_tier_hit_rate = config.min_tier_hit_rate,
+                      tier_retry_interval = config.tier_retry_interval,
+                      reveal_order = config.reveal_order,
+                      defer_marks = config.defer_marks).solve()
+    except KeyboardInterrupt:
+        pass
+    print(f"{'Won' if covid_game.won else 'Stopped'} after {covid_game.iter} commands in {time.time() - start:.3f}s "
+          f"with {len(covid_game.solved)} tiles solved and {len(covid_game.tiles)} kept in memory.")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,41 @@
 board_path = f"board.out"
 cmd_path = f"command.inp"
 result_path = f"result.txt"
+fast_startup = False
+shared_board_name = None
 
 
 # Solver args
 first_pos = None
 wait = 0
 use_least_square = True
-use_cp_solver = True
+use_cp_solver = False # Not used with use_model_counting
 timeout = 20
 min_num_sol_cp_solver = 20
+move_budget = None
+min_tier_hit_rate = 0.1
+tier_retry_interval = 10
+use_async_solver = False
+use_model_counting = True
+endgame_threshold = 20
+reveal_order = "info"
+defer_marks = True
 
 # Game args
 board_size = 9
 num_virus = 10
-board_wait = None
\ No newline at end of file
+board_wait = None
+record_path = None
+
+# Server args
+server_socket = "covidsafe.sock"
+server_port = 8765
+server_max_board_size = 100
+server_max_history = 10000
+server_session_timeout = 600
+
+# Chunked game args, used by chunked.py
+chunked_board_size = 100000
+virus_density = 0.15
+chunked_seed = 0
+tile_size = 64
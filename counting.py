@@ -0,0 +1,216 @@
+from fractions import Fraction
+from math import comb
+
+
+def split_components(constraints: list) -> list:
+    """Split `constraints` into groups sharing no variable.
+
+    `constraints` is a list of (variables, value) pairs meaning that exactly `value` of `variables` contain a virus.
+    Return a list of (variables, constraints) pairs, one for each group."""
+    components = [] # A list of (variables, constraints)
+    for cells, value in constraints:
+        variables = set(cells)
+        group = [(cells, value)]
+        for component in components[:]:
+            if component[0] & variables: # Share a variable so they must be counted together
+                variables |= component[0]
+                group.extend(component[1])
+                components.remove(component)
+        components.append((variables, group))
+
+    result = []
+    for variables, group in components:
+        ordered = []
+        for cells, _ in group:
+            for cell in cells:
+                if cell not in ordered:
+                    ordered.append(cell)
+        result.append((ordered, group))
+    return result
+
+
+def sweep_order(variables: list, constraints: list) -> list:
+    """Order `variables` so that variables sharing a constraint are close to each other.
+
+    The sweep starts from the variable in the fewest constraints, which is an end of the border for a long and thin frontier,
+    and goes through the other variables in breadth-first order. This keeps the number of constraints that are partly
+    assigned at any point of the sweep small."""
+    var_constraints = {var: [] for var in variables}
+    for idx, (cells, _) in enumerate(constraints):
+        for cell in cells:
+            var_constraints[cell].append(idx)
+
+    ordered = []
+    visited = set()
+    for start in sorted(variables, key=lambda var: len(var_constraints[var])):
+        if start in visited:
+            continue
+        visited.add(start)
+        queue = [start]
+        while queue:
+            var = queue.pop(0)
+            ordered.append(var)
+            for idx in var_constraints[var]:
+                for cell in constraints[idx][0]:
+                    if cell not in visited:
+                        visited.add(cell)
+                        queue.append(cell)
+    return ordered
+
+
+def count_component(variables: list, constraints: list) -> tuple:
+    """Count the configurations of `variables` satisfying `constraints` without enumerating them.
+
+    Variables are assigned one at a time in `sweep_order`. A state of the sweep is the number of viruses assigned so far to
+    each constraint that is partly assigned, so configurations reaching the same state are counted together. A forward pass
+    counts the ways to reach each state and a backward pass counts the ways to complete it, for each number of viruses.
+
+    Return (counts, cell_counts) where counts[k] is the number of configurations with k viruses and
+    cell_counts[k][i] is the number of those configurations having a virus in variables[i]."""
+    for cells, value in constraints: # A constraint that cannot be satisfied at all
+        if value < 0 or value > len(cells):
+            return {}, {}
+
+    order = sweep_order(variables, constraints)
+    position = {var: idx for idx, var in enumerate(order)}
+    num_vars = len(order)
+
+    var_constraints = [[] for _ in order] # Constraints containing each variable, with the number of their variables after it
+    first = [] # Position of the first variable of each constraint
+    last = [] # Position of the last variable of each constraint
+    for idx, (cells, _) in enumerate(constraints):
+        positions = sorted(position[cell] for cell in cells)
+        first.append(positions[0] if positions else -1)
+        last.append(positions[-1] if positions else -1)
+        for rank, pos in enumerate(positions):
+            var_constraints[pos].append((idx, len(positions) - rank - 1))
+
+    # active[i]: constraints that are partly assigned after assigning the first i variables
+    active = [[]]
+    for var_idx in range(num_vars):
+        started = [idx for idx, _ in var_constraints[var_idx] if first[idx] == var_idx and last[idx] > var_idx]
+        active.append(sorted([idx for idx in active[-1] if last[idx] != var_idx] + started))
+
+    def transition(var_idx: int, state: tuple, val: int):
+        """Return the state after assigning `val` to the variable at `var_idx` or None if a constraint is violated."""
+        sums = dict(zip(active[var_idx], state))
+        for idx, num_left in var_constraints[var_idx]:
+            sums[idx] = sums.get(idx, 0) + val
+            value = constraints[idx][1]
+            if sums[idx] > value or value - sums[idx] > num_left:
+                return None
+        return tuple(sums[idx] for idx in active[var_idx + 1])
+
+    def add_shifted(target: dict, source: dict, shift: int, factor: int = 1):
+        for total, count in source.items():
+            target[total + shift] = target.get(total + shift, 0) + count * factor
+
+    # Forward pass: forward[i][state][k] is the number of ways to assign the first i variables with k viruses
+    forward = [{(): {0: 1}}]
+    transitions = [] # transitions[i][(state, val)]: the state after assigning `val` to the i-th variable
+    for var_idx in range(num_vars):
+        next_states = {}
+        transitions.append({})
+        for state, totals in forward[var_idx].items():
+            for val in (0, 1):
+                next_state = transition(var_idx, state, val)
+                transitions[var_idx][(state, val)] = next_state
+                if next_state is not None:
+                    add_shifted(next_states.setdefault(next_state, {}), totals, val)
+        forward.append(next_states)
+
+    # Backward pass: backward[i][state][k] is the number of ways to assign the other variables with k viruses
+    backward = [None] * num_vars + [{(): {0: 1}}]
+    for var_idx in range(num_vars - 1, -1, -1):
+        backward[var_idx] = {}
+        for state in forward[var_idx]:
+            totals = {}
+            for val in (0, 1):
+                next_state = transitions[var_idx][(state, val)]
+                if next_state is not None and next_state in backward[var_idx + 1]:
+                    add_shifted(totals, backward[var_idx + 1][next_state], val)
+            if totals:
+                backward[var_idx][state] = totals
+
+    counts = backward[0].get((), {})
+    cell_counts = {total: [0] * len(variables) for total in counts}
+    index = {var: idx for idx, var in enumerate(variables)}
+    for var_idx, var in enumerate(order):
+        var_counts = {}
+        for state, totals in forward[var_idx].items():
+            next_state = transitions[var_idx][(state, 1)]
+            if next_state is None or next_state not in backward[var_idx + 1]:
+                continue
+            for total, count in totals.items():
+                add_shifted(var_counts, backward[var_idx + 1][next_state], total + 1, count)
+        for total, count in var_counts.items():
+            cell_counts[total][index[var]] = count
+
+    return counts, cell_counts
+
+
+def convolve(first: dict, second: dict) -> dict:
+    """Return the distribution of the total number of viruses of two independent groups of cells."""
+    result = {}
+    for first_total, first_count in first.items():
+        for second_total, second_count in second.items():
+            result[first_total + second_total] = result.get(first_total + second_total, 0) + first_count * second_count
+    return result
+
+
+def probabilities(constraints: list, num_interior: int, num_virus: int, density = None) -> tuple:
+    """Compute the exact probability that each cell contains a virus.
+
+    `constraints` is a list of (variables, value) pairs as in `split_components`. `num_interior` is the number of
+    unrevealed cells that are not in any constraint and `num_virus` is the number of viruses left among all unrevealed cells.
+    If `density` is given, each cell contains a virus independently with this probability instead, e.g. on a `ChunkedBoard`,
+    and `num_interior` and `num_virus` are not used.
+    Return (cell_probabilities, interior_probability) where cell_probabilities maps each variable to its probability.
+    Return (None, None) if no configuration is consistent with the board."""
+    components = [count_component(variables, group) + (variables,) for variables, group in split_components(constraints)]
+
+    if density is not None: # Components are independent so there is no need to combine them
+        density = Fraction(density).limit_denominator(10 ** 6)
+        cell_probabilities = {}
+        for counts, cell_counts, variables in components:
+            prior = {total: density ** total * (1 - density) ** (len(variables) - total) for total in counts}
+            weight = sum(count * prior[total] for total, count in counts.items())
+            if weight == 0:
+                return None, None
+            for var_idx, var in enumerate(variables):
+                cell_probabilities[var] = sum(count_per_cell[var_idx] * prior[total] for total, count_per_cell in cell_counts.items()) / weight
+        return cell_probabilities, density
+
+    def total_weight(distribution: dict, num_cells: int, num_virus: int) -> int:
+        """Number of configurations given the distribution of viruses in the frontier and `num_cells` interior cells."""
+        return sum(count * comb(num_cells, num_virus - total) for total, count in distribution.items() if 0 <= num_virus - total)
+
+    totals = {0: 1}
+    for counts, _, _ in components:
+        totals = convolve(totals, counts)
+
+    weight = total_weight(totals, num_interior, num_virus)
+    if weight == 0:
+        return None, None
+
+    cell_probabilities = {}
+    for idx, (counts, cell_counts, variables) in enumerate(components):
+        others = {0: 1} # Distribution of the total number of viruses in the other components
+        for other_idx, (other_counts, _, _) in enumerate(components):
+            if other_idx != idx:
+                others = convolve(others, other_counts)
+
+        numerators = [0] * len(variables)
+        for total, count_per_cell in cell_counts.items():
+            factor = total_weight(others, num_interior, num_virus - total)
+            for var_idx, count in enumerate(count_per_cell):
+                numerators[var_idx] += count * factor
+
+        for var, numerator in zip(variables, numerators):
+            cell_probabilities[var] = Fraction(numerator, weight)
+
+    interior_probability = None
+    if num_interior:
+        interior_probability = Fraction(total_weight(totals, num_interior - 1, num_virus - 1), weight)
+
+    return cell_probabilities, interior_probability
@@ -0,0 +1,38 @@
+import time
+import logging
+
+from ortools.sat.python import cp_model
+
+
+class CSPSolution(cp_model.CpSolverSolutionCallback):
+    def __init__(self,variables, time_limit = None, cp_solver = None):
+        self.__logger = logging.getLogger(name="solver")
+        self.__time_limit = time_limit
+        self.__start_time = time.time()
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.__variables = variables
+        self.solution_list = [] # Solution List
+        self.timeout = False
+        self.cancelled = False
+        self.cp_solver = cp_solver # The CpSolver running the search, stopped directly by `cancel`
+
+    def cancel(self):
+        """Stop the search. Solutions found so far should then be discarded.
+        Without `cp_solver`, the search only stops at the next solution found."""
+        self.cancelled = True
+        if self.cp_solver is not None:
+            self.cp_solver.StopSearch() # Has no effect if the search has not started yet
+
+    def on_solution_callback(self):
+        if self.cancelled:
+            self.StopSearch()
+            return
+        if self.__time_limit:
+            if time.time() - self.__start_time > self.__time_limit:
+                if self.__logger:
+                    self.__logger.warning(f"Time limit exceeded. Got {len(self.solution_list)} solutions so far.")
+                self.timeout = True
+                self.StopSearch()
+        sol = [self.Value(v) for v in self.__variables]
+        if sol not in self.solution_list:
+            self.solution_list.append(sol)
\ No newline at end of file
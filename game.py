@@ -5,6 +5,8 @@ import logging
 
 import config
 import util
+import shared_board
+import recording
 
 log_path = "game.log"
 util.clear(log_path)
@@ -25,59 +27,91 @@ class CovidGame:
         except KeyError:
             self.__wait = None
 
+        try: # Share the board with the solver through shared memory instead of writing it to board_filepath
+            shared_board_name = kwawgs["shared_board_name"]
+        except KeyError:
+            shared_board_name = None
+        self.shared_board = shared_board.SharedBoard.create(shared_board_name, board_size) if shared_board_name else None
+
+        try: # Do not print anything. Used when the game is driven from code, e.g. when replaying a recorded game
+            self.headless = kwawgs["headless"]
+        except KeyError:
+            self.headless = False
+
+        try: # Place viruses at these positions instead of randomly. Used to replay a recorded game
+            virus_positions = kwawgs["virus_positions"]
+        except KeyError:
+            virus_positions = None
+
         self.values = [[0 for i in range(board_size)] for j in range(board_size)]
         self.virus_values = [[' ' for i in range(board_size)] for j in range(board_size)]
+        self.codes = np.full((board_size, board_size), shared_board.HIDDEN, dtype=np.uint8) # virus_values as shared_board codes
         self.marking = []
-        self.visited = []
+        self.visited = set()
+        self.changes = [] # Cells changed by the last command as (row, col, value)
         self.clear()
-        self.creat_value()
+        self.creat_value(virus_positions)
         self.instruction()
         self.over = False
         self.iter = 0
 
-        logging.info(f'''Board created with virus position:''')
-        for idx, row in enumerate(self.values):
-            logging.info(f"{idx} {row}")
+        try: # Record the game to this file so that it can be replayed with recording.py
+            record_path = kwawgs["record_path"]
+        except KeyError:
+            record_path = None
+        self.recorder = recording.Recorder(record_path, self) if record_path else None
+
+        if not self.headless: # Games driven from code, e.g. by the server, are created too often to log every board
+            logging.info(f'''Board created with virus position:''')
+            for idx, row in enumerate(self.values):
+                logging.info(f"{idx} {row}")
 
     def creat_board(self):
         
+        if not self.headless:
+            print('\t\t======COVIDSafe======')
         
-        print('\t\t======COVIDSafe======')
-        
-        print('    ', end = '')
-        for i in range(self.board_size):
-            if (i<9):
-                print(str('0')+str(i+1), end = ' ')
-            else:
-                print(str(i+1), end = ' ')
+            print('    ', end = '')
+            for i in range(self.board_size):
+                if (i<9):
+                    print(str('0')+str(i+1), end = ' ')
+                else:
+                    print(str(i+1), end = ' ')
         
-        print('\n   ', end="")
-        for i in range(self.board_size):
-            print('___', end = '')
-        print('_')
-        for row in range(self.board_size):
-            if (row<9):
-                print(str('0'+str(row+1)), end = ' ')
-            else:
-                print(str(row+1), end = ' ')
-            for col in range(self.board_size):
-                print('|'+ ' '+str(self.virus_values[row][col]),end='')
-            print('|')
+            print('\n   ', end="")
+            for i in range(self.board_size):
+                print('___', end = '')
+            print('_')
+            for row in range(self.board_size):
+                if (row<9):
+                    print(str('0'+str(row+1)), end = ' ')
+                else:
+                    print(str(row+1), end = ' ')
+                for col in range(self.board_size):
+                    print('|'+ ' '+str(self.virus_values[row][col]),end='')
+                print('|')
         
         
-        if self.board_filepath is not None:
+        if self.shared_board is not None:
+            self.shared_board.write(self.codes, self.iter, self.num_virus_left)
+        elif self.board_filepath is not None:
             self.to_csv()
 
-    def creat_value(self):
+    def creat_value(self, virus_positions = None):
 
-        lst0 = [0 for i in range(self.board_size*self.board_size-self.num_virus)]
-        lst1 = [-1 for i in range(self.num_virus)]
+        if virus_positions is not None:
+            self.values = [[0 for i in range(self.board_size)] for j in range(self.board_size)]
+            for row, col in virus_positions:
+                self.values[row][col] = -1
+        else:
+            lst0 = [0 for i in range(self.board_size*self.board_size-self.num_virus)]
+            lst1 = [-1 for i in range(self.num_virus)]
 
-        # Place Virus randomly using numpy.permutation
-        arr = np.array(lst0+lst1)
-        arr2 = np.random.permutation(arr)
-        arr3 = arr2.reshape(self.board_size,self.board_size)
-        self.values = arr3.tolist()
+            # Place Virus randomly using numpy.permutation
+            arr = np.array(lst0+lst1)
+            arr2 = np.random.permutation(arr)
+            arr3 = arr2.reshape(self.board_size,self.board_size)
+            self.values = arr3.tolist()
 
         # Set values
         for row in range(self.board_size):
@@ -125,40 +159,58 @@ class CovidGame:
             return False
 
     def clear(self):
-        os.system('cls||clear')
+        if not self.headless:
+            os.system('cls||clear')
+
+    def show(self, *args, **kwargs):
+        if not self.headless:
+            print(*args, **kwargs)
+
+    def set_value(self, row, col, value):
+        """Set the value shown to the player of a cell and keep track of the change."""
+        if str(self.virus_values[row][col]) != str(value):
+            self.changes.append((row, col, value))
+        self.virus_values[row][col] = value
+        self.codes[row, col] = shared_board.encode(value)
 
     def neighbours(self, row, col):
-        if [row,col] not in self.visited:
-            self.visited.append([row,col])
-
-            if self.values[row][col] == 0:
-                self.virus_values[row][col] = self.values[row][col]
-
-                if row > 0:
-                    self.neighbours(row-1,col)
-                if col > 0:
-                    self.neighbours(row,col-1)
-                if row < self.board_size-1:
-                    self.neighbours(row+1,col)
-                if col < self.board_size-1:
-                    self.neighbours(row,col+1)
-                if row > 0 and col > 0:
-                    self.neighbours(row-1,col-1)
-                if row < self.board_size-1 and col < self.board_size-1:
-                    self.neighbours(row+1,col+1)
-                if row > 0 and col < self.board_size-1:
-                    self.neighbours(row-1,col+1)
-                if row < self.board_size-1 and col > 0:
-                    self.neighbours(row+1,col-1)
+        # Iterative since the area opened around zeros can be too large for recursion. Cells are opened in the same order
+        # as a recursive depth first search, neighbours being pushed in reverse order
+        stack = [(row, col)]
+        while stack:
+            row, col = stack.pop()
+            if (row, col) in self.visited:
+                continue
+            self.visited.add((row, col))
+            self.set_value(row, col, self.values[row][col])
             if self.values[row][col] != 0:
-                self.virus_values[row][col] = self.values[row][col]
+                continue
+
+            next_cells = []
+            if row > 0:
+                next_cells.append((row-1,col))
+            if col > 0:
+                next_cells.append((row,col-1))
+            if row < self.board_size-1:
+                next_cells.append((row+1,col))
+            if col < self.board_size-1:
+                next_cells.append((row,col+1))
+            if row > 0 and col > 0:
+                next_cells.append((row-1,col-1))
+            if row < self.board_size-1 and col < self.board_size-1:
+                next_cells.append((row+1,col+1))
+            if row > 0 and col < self.board_size-1:
+                next_cells.append((row-1,col+1))
+            if row < self.board_size-1 and col > 0:
+                next_cells.append((row+1,col-1))
+            stack.extend(reversed(next_cells))
 
     def instruction(self):
         pass
-        print('Enter the value to open the cell:')
-        print('Example: 3 4')
-        print('Enter the value and letter \'M\' to mark or unmark the cell as virus:')
-        print('Example: 4 5 M')
+        self.show('Enter the value to open the cell:')
+        self.show('Example: 3 4')
+        self.show('Enter the value and letter \'M\' to mark or unmark the cell as virus:')
+        self.show('Example: 4 5 M')
         
 
 
@@ -166,7 +218,7 @@ class CovidGame:
         for row in range(self.board_size):
             for col in range(self.board_size):
                 if self.values[row][col] == -1:
-                    self.virus_values[row][col] = 'V'
+                    self.set_value(row, col, 'V')
 
     def to_csv(self):
         with open(file=self.board_filepath, mode='w') as f:
@@ -196,114 +248,136 @@ class CovidGame:
         while not self.over:
             self.creat_board()
             user_input = self.get_input()
-            self.iter += 1
-
-            if len(user_input) == 2:
-                try:
-                    self.clear()
-                    val = list(map(int,user_input))
-                except ValueError:
-                    self.clear()
-                    print('Wrong input!')
-                    self.instruction()
-                    continue
-                
-            elif len(user_input) == 3:
-                if user_input[2] != 'M' and user_input[2] != 'm':
-                    self.clear()
-                    print('Wrong input!')
-                    self.instruction()
-                    continue
-                try:
-                    val = list(map(int,user_input[:2]))
-                except ValueError:
-                    self.clear()
-                    print('Wrong input!')
-                    self.instruction()
-                    continue
+            self.step(user_input)
 
-                if val[0] < 1 or val[1] < 1 or val[0] > self.board_size or val[1] > self.board_size:
-                    self.clear()
-                    print('Wrong input!')
-                    self.instruction()
-                    continue 
-                
-                # Standardlize user_input:
-                row = val[0]-1
-                col = val[1]-1
-
-                if [row,col] in self.marking: # Unmark marked cell
-                    self.clear()
-                    self.marking.remove([row, col])
-                    self.virus_values[row][col] = ' '
-                    continue
+        if self.shared_board is not None:
+            self.shared_board.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        #input("Press enter to exit.")
 
-                if self.virus_values[row][col] != ' ': # This cell already known
-                    self.clear()
-                    print('This cell is already know!')
-                    continue
-                
-                if len(self.marking) < self.num_virus:
-                    self.clear()
-                    self.marking.append([row,col])
-                    self.virus_values[row][col] = 'M'
-                    self.num_virus_left -= 1
-                    continue
-                else:
-                    self.clear()
-                    print('Marking finished!')
-                    continue
-                
-            else: # Wrong input
+    def step(self, user_input: list) -> list:
+        """Apply a command, given as [row, col] to reveal a cell or [row, col, 'M'] to mark or unmark it, with rows and
+        columns indexed from 1. Return the cells changed by the command as a list of (row, col, value)."""
+        self.iter += 1
+        self.changes = []
+        self.__apply(user_input)
+        if self.recorder is not None:
+            self.recorder.record(user_input, self.changes)
+            if self.over: # Games driven through step, e.g. by the server, are not closed by play
+                self.recorder.close()
+                self.recorder = None
+        return self.changes
+
+    def __apply(self, user_input: list):
+        if len(user_input) == 2:
+            try:
+                self.clear()
+                val = list(map(int,user_input))
+            except ValueError:
                 self.clear()
-                print(f'Input are too long!')
+                self.show('Wrong input!')
                 self.instruction()
-                continue
+                return
+            
+        elif len(user_input) == 3:
+            if user_input[2] != 'M' and user_input[2] != 'm':
+                self.clear()
+                self.show('Wrong input!')
+                self.instruction()
+                return
+            try:
+                val = list(map(int,user_input[:2]))
+            except ValueError:
+                self.clear()
+                self.show('Wrong input!')
+                self.instruction()
+                return
 
             if val[0] < 1 or val[1] < 1 or val[0] > self.board_size or val[1] > self.board_size:
-                    self.clear()
-                    print('Wrong input!')
-                    print(f"{val[0]}, {val[1]} ")
-                    self.instruction()
-                    continue 
-                
+                self.clear()
+                self.show('Wrong input!')
+                self.instruction()
+                return 
+            
+            # Standardlize user_input:
             row = val[0]-1
             col = val[1]-1
 
-            # Unflag if already flagged
-            if [row,col] in self.marking:
-                self.marking.remove([row,col])
-
-            # Game over
-            if self.values[row][col] == -1: 
-                self.virus_values[row][col] = 'V'
-                self.show_virus()   
-                self.creat_board()
-                print('GAME OVER!!!')
-                self.over = True
-                continue
-            
-            elif self.values[row][col] == 0:
-                self.visited = []
-                self.virus_values[row][col] = '0'
-                self.neighbours(row,col)
+            if [row,col] in self.marking: # Unmark marked cell
+                self.clear()
+                self.marking.remove([row, col])
+                self.set_value(row, col, ' ')
+                return
 
+            if self.virus_values[row][col] != ' ': # This cell already known
+                self.clear()
+                self.show('This cell is already know!')
+                return
+            
+            if len(self.marking) < self.num_virus:
+                self.clear()
+                self.marking.append([row,col])
+                self.set_value(row, col, 'M')
+                self.num_virus_left -= 1
+                return
             else:
-                self.virus_values[row][col] = self.values[row][col]
+                self.clear()
+                self.show('Marking finished!')
+                return
+            
+        else: # Wrong input
+            self.clear()
+            self.show(f'Input are too long!')
+            self.instruction()
+            return
 
-            if (self.check_over()):
-                self.show_virus()
-                self.creat_board()
-                print('YOU WIN!!!')
-                self.over = True
-        #input("Press enter to exit.")
+        if val[0] < 1 or val[1] < 1 or val[0] > self.board_size or val[1] > self.board_size:
+                self.clear()
+                self.show('Wrong input!')
+                self.show(f"{val[0]}, {val[1]} ")
+                self.instruction()
+                return 
+            
+        row = val[0]-1
+        col = val[1]-1
+
+        # Unflag if already flagged
+        if [row,col] in self.marking:
+            self.marking.remove([row,col])
+
+        # Game over
+        if self.values[row][col] == -1: 
+            self.set_value(row, col, 'V')
+            self.show_virus()   
+            self.creat_board()
+            self.show('GAME OVER!!!')
+            self.over = True
+            return
+        
+        elif self.values[row][col] == 0:
+            self.visited = set()
+            self.set_value(row, col, '0')
+            self.neighbours(row,col)
+            self.visited = set() # Only needed while opening neighbours
+
+        else:
+            self.set_value(row, col, self.values[row][col])
+
+        if (self.check_over()):
+            self.show_virus()
+            self.creat_board()
+            self.show('YOU WIN!!!')
+            self.over = True
 
 def main():
     game = CovidGame(board_size=config.board_size,
                     num_virus=config.num_virus,
                     board_filepath=config.board_path,
                     command_filepath=config.cmd_path,
-                    wait = config.board_wait)
+                    wait = config.board_wait,
+                    shared_board_name = config.shared_board_name,
+                    record_path = recording.numbered_path(config.record_path) if config.record_path else None)
     game.play()
 
 if __name__ == "__main__":
@@ -1,9 +1,10 @@
-import setup
+import config
 
-required  = {'numpy', 'ortools'}
-setup.setup(required)
+if not config.fast_startup:
+    import setup
 
-import config
+    required  = {'numpy', 'ortools'}
+    setup.setup(required)
 
 from multiprocessing import Process
 import subprocess
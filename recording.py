@@ -0,0 +1,163 @@
+import os
+import struct
+import time
+import random
+import argparse
+
+import numpy as np
+
+import config
+import shared_board
+
+# File layout: header, virus layout as a bitmap of board_size * board_size bits, then one record per command:
+# length of the command, the command as typed, number of changed cells and the changed cells as (row, col, code)
+MAGIC = b"CVSR"
+VERSION = 1
+HEADER = struct.Struct("<4sBII") # magic, version, board_size, num_virus
+COMMAND_LENGTH = struct.Struct("<H")
+NUM_CHANGES = struct.Struct("<I")
+CHANGE = struct.Struct("<IIB")
+
+
+class Recorder:
+    """Write a game to a compact binary file: the virus layout, then every command and the cells it changed.
+    Cells are stored with the codes of `shared_board`."""
+    def __init__(self, path: str, game):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, game.board_size, game.num_virus))
+        self.file.write(np.packbits(np.array(game.values) == -1).tobytes())
+        self.file.flush()
+
+    def record(self, user_input: list, changes: list):
+        command = " ".join(user_input).strip().encode()
+        self.file.write(COMMAND_LENGTH.pack(len(command)) + command)
+        self.file.write(NUM_CHANGES.pack(len(changes)))
+        self.file.write(b"".join(CHANGE.pack(row, col, shared_board.encode(value)) for row, col, value in changes))
+        self.file.flush() # Keep the record even if the game crashes
+
+    def close(self):
+        self.file.close()
+
+
+def numbered_path(path: str) -> str:
+    """Return `path` with the first number not used yet added to its name, e.g. game-3.rec for game.rec, so that every
+    game is recorded to its own file."""
+    root, extension = os.path.splitext(path)
+    number = 1
+    while os.path.exists(f"{root}-{number}{extension}"):
+        number += 1
+    return f"{root}-{number}{extension}"
+
+
+def load(path: str) -> tuple:
+    """Read a recorded game.
+    Return (board_size, num_virus, virus_positions, records) where records is a list of (command, changes)
+    and changes is a list of (row, col, code)."""
+    with open(path, "rb") as file:
+        data = file.read()
+
+    magic, version, board_size, num_virus = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a recorded game.")
+    offset = HEADER.size
+
+    layout_size = (board_size * board_size + 7) // 8
+    layout = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=layout_size, offset=offset))[:board_size * board_size]
+    virus_positions = [tuple(pos) for pos in np.argwhere(layout.reshape(board_size, board_size)).tolist()]
+    offset += layout_size
+
+    records = []
+    while offset < len(data):
+        (length,) = COMMAND_LENGTH.unpack_from(data, offset)
+        offset += COMMAND_LENGTH.size
+        command = data[offset:offset + length].decode()
+        offset += length
+
+        (num_changes,) = NUM_CHANGES.unpack_from(data, offset)
+        offset += NUM_CHANGES.size
+        changes = [CHANGE.unpack_from(data, offset + idx * CHANGE.size) for idx in range(num_changes)]
+        offset += num_changes * CHANGE.size
+        records.append((command, changes))
+
+    return board_size, num_virus, virus_positions, records
+
+
+def new_game(path: str, num_commands: int = 0):
+    """Return a headless game with the recorded layout, together with the recorded commands.
+    The first `num_commands` recorded commands are applied to the game, so it is in the recorded position after them."""
+    import game
+
+    board_size, num_virus, virus_positions, records = load(path)
+    if not 0 <= num_commands <= len(records):
+        raise ValueError(f"{path} has {len(records)} commands, cannot apply {num_commands} of them.")
+
+    covid_game = game.CovidGame(board_size=board_size, num_virus=num_virus, virus_positions=virus_positions, headless=True)
+    for command, _ in records[:num_commands]:
+        covid_game.step(command.split(" "))
+    return covid_game, records
+
+
+def check(path: str) -> bool:
+    """Apply the recorded commands to a new game and check that they change the same cells as in the recorded game."""
+    covid_game, records = new_game(path)
+    for idx, (command, changes) in enumerate(records):
+        replayed = [(row, col, shared_board.encode(value)) for row, col, value in covid_game.step(command.split(" "))]
+        if replayed != changes:
+            print(f"Command {idx + 1} ({command}) changed {replayed} instead of {changes}.")
+            return False
+    return True
+
+
+def replay(path: str, seed: int = 0, num_commands: int = 0, **solver_kwargs) -> tuple:
+    """Run a `Solver` with `solver_kwargs` against the recorded layout in this process, without any file or other process.
+    The first `num_commands` recorded commands are applied before the solver takes over, so that it starts from the recorded
+    position after them, e.g. right before a slow move. Random choices are seeded with `seed` so the same configuration always
+    plays the same game, except that CpSolver stopped by its time limit may not find the same solutions every time.
+    Return (solved, number of commands sent by the solver, seconds)."""
+    import solver
+
+    covid_game, _ = new_game(path, num_commands)
+    if covid_game.over:
+        raise ValueError(f"The game is already over after {num_commands} commands.")
+    if num_commands:
+        solver_kwargs["first_pos"] = None # The first cell was already revealed
+
+    random.seed(seed)
+    start = time.time()
+    covid_solver = solver.Solver(game=covid_game, **solver_kwargs)
+    covid_solver.solve()
+    return covid_solver.solved, covid_game.iter - num_commands, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a game recorded with `record_path`.")
+    parser.add_argument("path", help="the recorded game")
+    parser.add_argument("--check", action="store_true", help="replay the recorded commands instead of running the solver")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the solver's random choices")
+    parser.add_argument("--commands", type=int, default=0, help="apply this many recorded commands before the solver takes over")
+    args = parser.parse_args()
+
+    if args.check:
+        print("Replay matches the recording." if check(args.path) else "Replay does not match the recording!")
+        return
+
+    solved, num_commands, seconds = replay(args.path,
+                                           seed=args.seed,
+                                           num_commands=args.commands,
+                                           first_pos=config.first_pos,
+                                           use_least_square = config.use_least_square,
+                                           use_cp_solver = config.use_cp_solver,
+                                           csp_timeout = config.timeout,
+                                           min_num_sol_cp_solver = config.min_num_sol_cp_solver,
+                                           move_budget = config.move_budget,
+                                           use_async_solver = config.use_async_solver,
+                                           use_model_counting = config.use_model_counting,
+                                           endgame_threshold = config.endgame_threshold,
+                                           min_tier_hit_rate = config.min_tier_hit_rate,
+                                           tier_retry_interval = config.tier_retry_interval,
+                                           reveal_order = config.reveal_order,
+                                           defer_marks = config.defer_marks)
+    print(f"{'Solved' if solved else 'Failed'} after {num_commands} commands in {seconds:.3f}s.")
+
+if __name__ == "__main__":
+    main()
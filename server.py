@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import bisect
+import random
+import socket
+import asyncio
+import logging
+
+import config
+import game
+
+logger = logging.getLogger("server")
+
+# Protocol: one JSON object per line in both directions. Rows and columns are indexed from 0.
+#   {"op": "create", "board_size": 9, "num_virus": 10, "seed": null} -> {"game": id}
+#   {"op": "reveal" | "mark", "game": id, "row": r, "col": c}        -> {"iter", "num_virus_left", "over", "changes"}
+#   {"op": "moves", "game": id, "moves": [[r, c], [r, c, "M"], ...]} -> same as "reveal", with the changes of every move
+#   {"op": "state", "game": id}                                      -> {"iter", "num_virus_left", "over", "board"}
+#   {"op": "delta", "game": id, "since": iter}                       -> {"iter", "num_virus_left", "over", "changes"}
+#   {"op": "close", "game": id}                                      -> {}
+# Every response also has "ok", and "error" if "ok" is false. Changes are [row, col, value] ([iter, row, col, value] for
+# "delta") and the board is a list of rows, each a string with one character per cell as in `CovidGame.to_csv`.
+# Only the last changes of a game are kept, so "delta" fails if some changes since `since` were dropped. Games are
+# removed once they receive no request for `config.server_session_timeout` seconds.
+
+
+class Session:
+    """A game hosted by the server, with the last changes so that clients can ask for what they missed."""
+    __slots__ = ("game", "history", "dropped", "last_used")
+
+    def __init__(self, covid_game):
+        self.game = covid_game
+        self.history = [] # (iter, row, col, value) of the last changed cells, in order
+        self.dropped = 0 # Changes of commands up to this iter may have been dropped from history
+        self.last_used = time.monotonic()
+
+
+class GameServer:
+    """Host many games in a single asyncio event loop."""
+    def __init__(self, max_board_size: int = None, max_history: int = None, session_timeout = config.server_session_timeout):
+        self.sessions = {}
+        self.next_id = 1
+        self.max_board_size = max_board_size if max_board_size is not None else config.server_max_board_size
+        self.max_history = max_history if max_history is not None else config.server_max_history
+        self.session_timeout = session_timeout # If None, games never expire
+
+    def create(self, board_size: int, num_virus: int, seed = None) -> dict:
+        if not 1 <= board_size <= self.max_board_size: # Games are played on the event loop, so they must stay small
+            raise ValueError(f"Board size must be between 1 and {self.max_board_size}.")
+        if not 0 <= num_virus <= board_size * board_size:
+            raise ValueError("Too many viruses for the board.")
+        cells = random.Random(seed).sample(range(board_size * board_size), num_virus)
+        covid_game = game.CovidGame(board_size=board_size, num_virus=num_virus, headless=True,
+                                    virus_positions=[divmod(cell, board_size) for cell in cells])
+        game_id = self.next_id
+        self.next_id += 1
+        self.sessions[game_id] = Session(covid_game)
+        return {"game": game_id}
+
+    def session(self, game_id: int) -> Session:
+        try:
+            session = self.sessions[game_id]
+        except KeyError:
+            raise ValueError(f"Game {game_id} does not exist.")
+        session.last_used = time.monotonic()
+        return session
+
+    def expire(self):
+        """Remove the games that received no request for `session_timeout` seconds."""
+        if self.session_timeout is None:
+            return
+        now = time.monotonic()
+        for game_id in [game_id for game_id, session in self.sessions.items() if now - session.last_used > self.session_timeout]:
+            del self.sessions[game_id]
+            logger.info(f"Game {game_id} expired.")
+
+    def status(self, session: Session) -> dict:
+        covid_game = session.game
+        return {"iter": covid_game.iter, "num_virus_left": covid_game.num_virus_left, "over": covid_game.over}
+
+    def moves(self, game_id: int, moves: list) -> dict:
+        session = self.session(game_id)
+        changes = []
+        for move in moves:
+            if session.game.over:
+                break
+            row, col = int(move[0]), int(move[1])
+            user_input = [str(row + 1), str(col + 1)] + (["M"] if len(move) == 3 else []) # Games are indexed from 1
+            for row, col, value in session.game.step(user_input):
+                changes.append([row, col, str(value)])
+                session.history.append((session.game.iter, row, col, str(value)))
+
+        if len(session.history) > 2 * self.max_history: # Trimmed in batches so that each change is only moved once
+            cut = len(session.history) - self.max_history
+            session.dropped = session.history[cut - 1][0]
+            del session.history[:cut]
+        return dict(self.status(session), changes=changes)
+
+    def state(self, game_id: int) -> dict:
+        session = self.session(game_id)
+        board = ["".join(str(value) for value in row) for row in session.game.virus_values]
+        return dict(self.status(session), board=board)
+
+    def delta(self, game_id: int, since: int) -> dict:
+        session = self.session(game_id)
+        if since < session.dropped:
+            raise ValueError(f"Changes up to iter {session.dropped} were dropped, ask for the state instead.")
+        start = bisect.bisect_right(session.history, (since, float("inf"))) # First change of a command after `since`
+        changes = [list(change) for change in session.history[start:]]
+        return dict(self.status(session), changes=changes)
+
+    def close(self, game_id: int) -> dict:
+        self.session(game_id)
+        del self.sessions[game_id]
+        return {}
+
+    def dispatch(self, request: dict) -> dict:
+        op = request["op"]
+        if op == "create":
+            return self.create(int(request["board_size"]), int(request["num_virus"]), request.get("seed"))
+        if op in ("reveal", "mark"):
+            move = [request["row"], request["col"]] + (["M"] if op == "mark" else [])
+            return self.moves(request["game"], [move])
+        if op == "moves":
+            return self.moves(request["game"], request["moves"])
+        if op == "state":
+            return self.state(request["game"])
+        if op == "delta":
+            return self.delta(request["game"], int(request.get("since", 0)))
+        if op == "close":
+            return self.close(request["game"])
+        raise ValueError(f"Unknown operation {op}.")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer the requests of a client until it disconnects. Games are not tied to a connection."""
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                response = dict(self.dispatch(json.loads(line)), ok=True)
+            except (ValueError, KeyError, TypeError, IndexError) as error:
+                response = {"ok": False, "error": str(error)}
+            except Exception as error: # Keep the connection open, the client only gets an error for this request
+                logger.exception(f"Request {line!r} failed")
+                response = {"ok": False, "error": f"Internal error: {error!r}"}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        writer.close()
+
+
+async def serve(path: str = None, port: int = None):
+    """Serve games on the unix socket `path`, or on localhost:`port` where unix sockets are not available."""
+    server = GameServer()
+    if hasattr(socket, "AF_UNIX"):
+        if os.path.exists(path):
+            os.remove(path) # Left by a previous server
+        listener = await asyncio.start_unix_server(server.handle, path=path)
+        logger.info(f"Serving games on {path}")
+    else:
+        listener = await asyncio.start_server(server.handle, host="127.0.0.1", port=port)
+        logger.info(f"Serving games on 127.0.0.1:{port}")
+    async with listener:
+        expiry = asyncio.create_task(expire_sessions(server))
+        try:
+            await listener.serve_forever()
+        finally:
+            expiry.cancel()
+
+
+async def expire_sessions(server: GameServer):
+    """Remove unused games from time to time."""
+    if server.session_timeout is None:
+        return
+    while True:
+        await asyncio.sleep(min(server.session_timeout, 60))
+        server.expire()
+
+
+class RemoteGame:
+    """A game hosted by a server. It has the attributes `Solver` reads from a `CovidGame`, so it can be passed to `Solver`
+    as `game` to solve games hosted by the server."""
+    def __init__(self, board_size: int, num_virus: int, seed = None, path: str = None, port: int = None):
+        if hasattr(socket, "AF_UNIX"):
+            self.socket = socket.socket(socket.AF_UNIX)
+            self.socket.connect(path if path is not None else config.server_socket)
+        else:
+            self.socket = socket.create_connection(("127.0.0.1", port if port is not None else config.server_port))
+        self.file = self.socket.makefile("rwb")
+
+        self.id = self.request(op="create", board_size=board_size, num_virus=num_virus, seed=seed)["game"]
+        self.board_size = board_size
+        self.num_virus = num_virus
+        self.num_virus_left = num_virus
+        self.iter = 0
+        self.over = False
+        self.virus_values = [[' ' for i in range(board_size)] for j in range(board_size)]
+
+    def request(self, **request) -> dict:
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if not response["ok"]:
+            raise ValueError(response["error"])
+        return response
+
+    def step(self, user_input: list) -> list:
+        """Send a command in the same format as `CovidGame.step` and return the changed cells."""
+        op = "mark" if len(user_input) == 3 else "reveal"
+        response = self.request(op=op, game=self.id, row=int(user_input[0]) - 1, col=int(user_input[1]) - 1)
+        for row, col, value in response["changes"]:
+            self.virus_values[row][col] = value
+        self.iter = response["iter"]
+        self.num_virus_left = response["num_virus_left"]
+        self.over = response["over"]
+        return response["changes"]
+
+    def close(self):
+        self.request(op="close", game=self.id)
+        self.file.close()
+        self.socket.close()
+
+
+def main():
+    asyncio.run(serve(path=config.server_socket, port=config.server_port))
+
+if __name__ == "__main__":
+    main()
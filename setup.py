@@ -1,9 +1,9 @@
 import sys
 import subprocess
-import pkg_resources
+import importlib.util
 def setup(required):
-    installed = {pkg.key for pkg in pkg_resources.working_set}
-    missing   = required - installed
+    # Only look for the modules we need instead of scanning every installed package with pkg_resources, which is slow
+    missing   = {pkg for pkg in required if importlib.util.find_spec(pkg) is None}
 
     if missing:
         # implement pip as a subprocess:
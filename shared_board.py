@@ -0,0 +1,105 @@
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+# Cells are stored as uint8 codes: 0-8 for revealed numbers and the codes below for the others
+HIDDEN = 9
+MARKED = 10
+VIRUS = 11
+CELL_VALUES = np.array([str(value) for value in range(9)] + [" ", "M", "V"]) # Code -> value of the cell as written by CovidGame.to_csv
+CELL_CODES = {" ": HIDDEN, "M": MARKED, "V": VIRUS}
+
+# Header: [sequence, iter, num_virus_left, board_size, closed] as int64, followed by the cells
+SEQUENCE, ITER, NUM_VIRUS_LEFT, BOARD_SIZE, CLOSED = range(5)
+HEADER_SIZE = 5 * 8
+
+
+def encode(value) -> int:
+    """Return the code of a cell given its value as in `CovidGame.virus_values`."""
+    return CELL_CODES[value] if value in CELL_CODES else int(value)
+
+
+class SharedBoard:
+    """Board state shared between the game and the solver through `multiprocessing.shared_memory`.
+
+    The game writes the board with `write` and the solver reads it with `read`. The sequence number is odd while the game
+    is writing, so a read that overlaps a write is detected and retried."""
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.owner = owner
+        self.header = np.ndarray((5,), dtype=np.int64, buffer=memory.buf)
+        board_size = int(self.header[BOARD_SIZE])
+        self.cells = np.ndarray((board_size, board_size), dtype=np.uint8, buffer=memory.buf, offset=HEADER_SIZE) # Zero-copy view of the board
+
+    @classmethod
+    def create(cls, name: str, board_size: int):
+        """Create the shared board. A board left with the same name by a previous game is closed and removed first."""
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            np.ndarray((5,), dtype=np.int64, buffer=stale.buf)[CLOSED] = 1 # Tell solvers attached to it to attach again
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        memory = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + board_size * board_size)
+        header = np.ndarray((5,), dtype=np.int64, buffer=memory.buf)
+        header[:] = 0
+        header[ITER] = -1 # Nothing has been written yet
+        header[BOARD_SIZE] = board_size # Set last since solvers wait for it before using the board
+        del header
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, wait: float = 0.01):
+        """Attach to a shared board created by the game, waiting until it exists."""
+        while True:
+            try:
+                try:
+                    memory = shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+                except TypeError:
+                    memory = shared_memory.SharedMemory(name=name)
+                    # Otherwise the board would be removed when the solver exits even if a new game is using it
+                    resource_tracker.unregister(memory._name, "shared_memory")
+            except FileNotFoundError:
+                time.sleep(wait)
+                continue
+
+            while not np.ndarray((5,), dtype=np.int64, buffer=memory.buf)[BOARD_SIZE]: # The game is still creating the board
+                time.sleep(wait)
+            return cls(memory, owner=False)
+
+    @property
+    def closed(self) -> bool:
+        """Whether the game that created the board is over."""
+        return bool(self.header[CLOSED])
+
+    def write(self, codes: np.ndarray, iter: int, num_virus_left: int):
+        """Write the board given the codes of its cells, as in `CovidGame.codes`."""
+        self.header[SEQUENCE] += 1
+        self.cells[:] = codes
+        self.header[ITER] = iter
+        self.header[NUM_VIRUS_LEFT] = num_virus_left
+        self.header[SEQUENCE] += 1
+
+    def read(self) -> tuple:
+        """Return (iter, num_virus_left, cells) from a consistent snapshot of the board. `cells` is a copy of the codes
+        taken in a single copy of the buffer, so the game can keep writing while it is used."""
+        while True:
+            sequence = int(self.header[SEQUENCE])
+            if sequence % 2: # The game is writing
+                continue
+            iter, num_virus_left = int(self.header[ITER]), int(self.header[NUM_VIRUS_LEFT])
+            cells = self.cells.copy()
+            if int(self.header[SEQUENCE]) == sequence:
+                return iter, num_virus_left, cells
+
+    def close(self):
+        """Detach from the board. The game also marks the board as closed and removes it."""
+        if self.owner:
+            self.header[CLOSED] = 1
+        del self.header, self.cells # Views must be released before closing the memory
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -1,13 +1,18 @@
 import util
 import config
+import counting
+import shared_board
 
 import random
 import time
+import os
 import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
-from ortools.sat.python import cp_model
+# ortools is imported only when cp_solver is actually used since importing it takes most of the start up time.
 
 log_path = "solver.log"
 util.clear(log_path)
@@ -43,10 +48,9 @@ class Solver:
 
         try: # Whether to use cp_solver or not
             self.__use_cp_solver = kwargs["use_cp_solver"]
-            if self.__use_cp_solver:
-                self.__cp_solver = cp_model.CpSolver()
         except KeyError:
             self.__use_cp_solver = False
+        self.__cp_solver = None # Created on first use
 
         try: # Set timeout for csp solver
             self.__csp_timeout = kwargs["csp_timeout"]
@@ -55,11 +59,68 @@ class Solver:
             self.__csp_timeout = 30
             self.__min_num_sol_cp_solver = None
 
+        try: # A CovidGame to play directly in this process instead of through files, e.g. when replaying a recorded game
+            self.__game = kwargs["game"]
+        except KeyError:
+            self.__game = None
+        self.__windowed = hasattr(self.__game, "window") # Only a window of the board can be read, e.g. a ChunkedCovidGame
+        self.__offset = (0, 0) # Position of the top left cell of the window in the board
+
+        try: # Name of the shared memory the game writes the board to. If None, the board is read from board_path
+            self.__shared_board_name = kwargs["shared_board_name"]
+        except KeyError:
+            self.__shared_board_name = None
+        self.__shared_board = None # Attached on first read
+        self.__cells = None # Codes of the cells at the last read of the shared board
+
         try: # Wait for a few seconds before executing the next iteration
             self.__wait = kwargs["wait"]
         except KeyError:
             self.__wait = None
 
+        try: # Whether to run least square and cp_solver in background threads and write forced cells as soon as they are found
+            self.__use_async_solver = kwargs["use_async_solver"]
+        except KeyError:
+            self.__use_async_solver = False
+
+        try: # Whether to find cells by counting configurations instead of listing all solutions with cp_solver
+            self.__use_model_counting = kwargs["use_model_counting"]
+        except KeyError:
+            self.__use_model_counting = False
+        if self.__use_model_counting and (self.__use_cp_solver or self.__use_async_solver):
+            logger.warning("use_cp_solver and use_async_solver are ignored since use_model_counting is set.")
+
+        try: # Count every configuration of the unrevealed cells once there are at most this many of them. If None, never do so
+            self.__endgame_threshold = kwargs["endgame_threshold"]
+        except KeyError:
+            self.__endgame_threshold = None
+
+        try: # Order in which safe cells are revealed: "fifo" in the order they were found, "info" the most informative first
+            self.__reveal_order = kwargs["reveal_order"]
+        except KeyError:
+            self.__reveal_order = "fifo"
+
+        try: # Whether to remember viruses in the solver instead of marking them in the game, which tells nothing new
+            self.__defer_marks = kwargs["defer_marks"]
+        except KeyError:
+            self.__defer_marks = False
+        self.__deferred_marks = set() # Positions in the whole board of viruses found but not marked in the game
+
+        try: # Time budget (in seconds) for the heavy tiers in a single move. If None, tiers always run in fixed order
+            self.__move_budget = kwargs["move_budget"]
+        except KeyError:
+            self.__move_budget = None
+
+        try: # Tiers whose hit rate in this run drops below this value are skipped when a move budget is set
+            self.__min_tier_hit_rate = kwargs["min_tier_hit_rate"]
+        except KeyError:
+            self.__min_tier_hit_rate = 0.1
+
+        try: # A tier skipped for its hit rate is tried again once every this many moves. If None, it is never tried again
+            self.__tier_retry_interval = kwargs["tier_retry_interval"]
+        except KeyError:
+            self.__tier_retry_interval = 10
+
         logger.info(f"""Solver object was created with config:
                             board_path = {self.board_path}
                             command_path = {self.command_path}
@@ -68,7 +129,13 @@ class Solver:
                             use_cp_solver = {self.__use_cp_solver}
                             first_pos = {self.__first_pos}
                             use_cp_solver = {self.__use_cp_solver}
-                            timeout = {self.__csp_timeout}""")
+                            timeout = {self.__csp_timeout}
+                            move_budget = {self.__move_budget}
+                            use_async_solver = {self.__use_async_solver}
+                            use_model_counting = {self.__use_model_counting}
+                            endgame_threshold = {self.__endgame_threshold}
+                            reveal_order = {self.__reveal_order}
+                            defer_marks = {self.__defer_marks}""")
 
         self.__iter = 0 # Used to sync between solver and game board
         self.solved = False # Whether the problem has been solved
@@ -77,6 +144,9 @@ class Solver:
         self.__safe = [] # A list of  positions of cells that can be safely opened
         self.__border = [] # A list of positions of cells that are in the border. Go to __find_cells_in_border to read more.
         self.__undiscovered = [] # A list of positions of cells that aren't opened
+        self.__board_state = [] # Values of the cells as strings, read from the game
+        self.__virus_map = [] # 1 for marked cells and 0 for the others
+        self.__tier_stats = {tier: {"attempts": 0, "hits": 0, "time": 0.0, "num_vars": 0, "skipped": 0} for tier in ("least_square", "cp", "counting")} # Recorded per run, used to schedule tiers
 
     def __find_cells_in_border(self):
         """Return a list of positions of cells that are discovered and containing positive numbers whose neighbors aren't fully discovered.
@@ -123,6 +193,16 @@ class Solver:
 
     def __read_board(self):
         """Read the current board state."""
+        if self.__game is not None:
+            self.__read_game()
+        elif self.__shared_board_name is not None:
+            self.__read_shared_board()
+        else:
+            self.__read_board_file()
+        self.__show_deferred_marks()
+
+    def __read_board_file(self):
+        """Read the current board state from board_path once the game has written the board of the current iteration."""
         path = self.board_path
         self.__undiscovered = []
         while True: # Wait for the file to be updated
@@ -148,23 +228,120 @@ class Solver:
                 except ValueError:
                     pass
 
+    def __read_game(self):
+        """Read the current board state from the game played in this process."""
+        self.__num_virus_left = self.__game.num_virus_left
+        if self.__windowed:
+            row, col, self.__board_state = self.__game.window()
+            row_shift, col_shift = self.__offset[0] - row, self.__offset[1] - col
+            if row_shift or col_shift: # Cells still to be written were found in the previous window
+                self.__mark = [(pos_row + row_shift, pos_col + col_shift) for pos_row, pos_col in self.__mark]
+                self.__safe = [(pos_row + row_shift, pos_col + col_shift) for pos_row, pos_col in self.__safe]
+            self.__offset = (row, col)
+        else:
+            self.__board_state = [[str(value) for value in row] for row in self.__game.virus_values]
+        self.__virus_map = [[int(cell == "M") for cell in row] for row in self.__board_state]
+        self.__undiscovered = [(row_idx, col_idx) for row_idx, row in enumerate(self.__board_state) for col_idx, cell in enumerate(row) if cell == " "]
+
+    def __read_shared_board(self):
+        """Read the current board state from the shared memory written by the game. Cells are stored as codes so there
+        is nothing to parse, and only the cells changed since the last read are converted to strings."""
+        if self.__shared_board is None:
+            self.__shared_board = shared_board.SharedBoard.attach(self.__shared_board_name)
+
+        while True: # Wait for the board to be updated
+            closed = self.__shared_board.closed # Checked before reading since the game writes its last board before closing
+            iter, num_virus_left, cells = self.__shared_board.read()
+            if iter == self.__iter:
+                break
+            if closed: # Left by a previous game
+                self.__shared_board.close()
+                self.__shared_board = shared_board.SharedBoard.attach(self.__shared_board_name)
+
+        self.__num_virus_left = num_virus_left
+        previous, self.__cells = self.__cells, cells
+        if previous is None or previous.shape != cells.shape:
+            self.__board_state = shared_board.CELL_VALUES[cells].tolist()
+            self.__virus_map = (cells == shared_board.MARKED).astype(int).tolist()
+        else:
+            rows, cols = np.nonzero(cells != previous)
+            # Deferred marks are shown again below, which also counts them in __num_virus_left
+            for row, col in list(zip(rows.tolist(), cols.tolist())) + list(self.__deferred_marks):
+                code = int(cells[row, col])
+                self.__board_state[row][col] = str(shared_board.CELL_VALUES[code])
+                self.__virus_map[row][col] = int(code == shared_board.MARKED)
+        rows, cols = np.nonzero(cells == shared_board.HIDDEN)
+        self.__undiscovered = list(zip(rows.tolist(), cols.tolist()))
+
+    def __show_deferred_marks(self):
+        """Show the viruses found but not marked in the game as if they had been marked."""
+        if not self.__deferred_marks:
+            return
+
+        shown = set()
+        outside = set()
+        for pos in self.__deferred_marks:
+            row, col = pos[0] - self.__offset[0], pos[1] - self.__offset[1] # Position in the window if only a window was read
+            if not (0 <= row < len(self.__board_state) and 0 <= col < len(self.__board_state[0])):
+                outside.add(pos)
+            elif self.__board_state[row][col] == " ":
+                self.__board_state[row][col] = "M"
+                self.__virus_map[row][col] = 1
+                self.__num_virus_left -= 1
+                shown.add((row, col))
+        # A window only leaves out tiles that are solved along with every tile around them, and the game shows their viruses
+        self.__deferred_marks -= outside
+        if shown:
+            self.__undiscovered = [pos for pos in self.__undiscovered if pos not in shown]
+
     def __write_all_possible(self):
-        while self.__mark or self.__safe:
+        if self.__defer_marks and self.__mark:
+            self.__deferred_marks.update((row + self.__offset[0], col + self.__offset[1]) for row, col in self.__mark)
+            logger.info(f"Cells {self.__mark} were kept as viruses instead of being marked.")
+            self.__mark = []
+            self.__show_deferred_marks()
+
+        if self.__reveal_order == "info":
+            self.__sort_safe_cells()
+        while (self.__mark or self.__safe) and not self.__finished:
             self.__write_command()
 
     def __write_command(self, row = None, col = None, mark = None):
 
+        synced = False
         if ((row is None) and (col is None) and (mark is None)):
+            if self.__reveal_order == "info" and self.__safe: # Skip cells opened by the last command
+                if self.__game is None: # A game in this process already gave the cells changed by the last command
+                    self.__read_board()
+                    self.__check_finished()
+                    synced = True
+                self.__safe = [(row, col) for row, col in self.__safe if self.__board_state[row][col] == " "]
+                if self.__finished or not (self.__mark or self.__safe):
+                    return
             (row, col), mark = self.__choose_pos()
 
         if self.__wait:
             time.sleep(self.__wait)
 
-        self.__read_board() # Called to wait for sync
+        if not synced and (self.__game is None or self.__game.over): # A game in this process needs no sync, so it is only read once over
+            self.__read_board() # Called to wait for sync
+            self.__check_finished()
+        if self.__finished: # The game is over and will not read any other command
+            return
         
         logger.info(f"Cell {(row, col)} was {'marked' if mark else 'revealed'}.")
 
+        row, col = row + self.__offset[0], col + self.__offset[1] # Position in the whole board if only a window was read
         content = f"{row + 1} {col + 1} M" if mark else f"{row + 1} {col + 1}" # Board are indexed from 1 instead of 0
+        if self.__game is not None:
+            self.__iter += 1
+            for row, col, value in self.__game.step(content.split(" ")): # Keep the board up to date without reading it again
+                row, col = row - self.__offset[0], col - self.__offset[1]
+                if 0 <= row < len(self.__board_state) and 0 <= col < len(self.__board_state[0]):
+                    self.__board_state[row][col] = str(value)
+                    self.__virus_map[row][col] = int(value == "M")
+            return
+
         with open(self.command_path, mode = 'w') as cmd:
             self.__iter += 1
             cmd.write(f"{self.__iter}\n")
@@ -224,11 +401,18 @@ class Solver:
                 logger.info(f"New safe to open cell after discovering {(cell_row, cell_col)}: {undiscovered}")
                 self.__safe.extend(undiscovered)
 
-    def __create_cp_variables(self):
+    def __create_cp_variables(self, border = None):
+        """Create a model whose constraints come from the cells in `border`. If `border` is None, the whole border is used."""
+        if border is None:
+            border = self.__border
+
+        from ortools.sat.python import cp_model
+
         var = []
         var_pos = []
+        virus_map = [row[:] for row in self.__virus_map] # A copy so that other tiers still see 0 and 1 in __virus_map
         model = cp_model.CpModel()
-        for row, col in self.__border:
+        for row, col in border:
             cell_neighbor = self.__neighbors(row, col)
 
             # Making neighbors cells IntVar if they are unrevealed (have values == " ")
@@ -239,12 +423,12 @@ class Solver:
 
                     int_var = model.NewIntVar(0, 1, name=f"{neighbor_row} {neighbor_col}")
                     logger.info(f"Cell {(neighbor_row, neighbor_col)} was added as a variable to the model.")
-                    self.__virus_map[neighbor_row][neighbor_col] = int_var
+                    virus_map[neighbor_row][neighbor_col] = int_var
                     var.append(int_var)
                     var_pos.append((neighbor_row, neighbor_col))
             
             # This dict containing pairs of key and value where the key is the position of a cell and the value is whether that cell contains virus
-            neighbor_dict = util.neighbors(board=self.__virus_map, row=row, col=col) 
+            neighbor_dict = util.neighbors(board=virus_map, row=row, col=col) 
             model.Add(sum(neighbor_dict.values()) == int(self.__board_state[row][col]))
         
         # Total number of viruses found must be smaller than num_virus_left
@@ -290,13 +474,16 @@ class Solver:
         # Solving param @ var = target. Since there can be many solutions, we use least square method.
         # The parts of `var` that unchange between solutions should have value around its true value (1 if contain virus and 0 otherwise)
         res = np.linalg.lstsq(param, target, rcond=None)[0]
+        self.__add_least_square_cells(var, res)
 
+    def __add_least_square_cells(self, var: list, res):
+        """Add cells whose least square results are integers to the list of cells to be marked or revealed."""
         int_res = np.around(res)
         threshold = 10**-8
         flag = (np.abs(res - int_res) < threshold) # Result may be slightly off because of machine precision
 
         for idx, pos in enumerate(var):
-            if flag[idx]:
+            if flag[idx] and self.__is_new_cell(pos):
                 if int_res[idx] == 1:
                     self.__mark.append(pos)
                     logger.info(f"Cell {pos} is virus")
@@ -307,10 +494,15 @@ class Solver:
         if not sum(flag):
             logger.warning(f"No context found using least square solver")
 
+    def __is_new_cell(self, pos: tuple) -> bool:
+        """Return whether `pos` is unrevealed and not yet in the list of cells to be marked or revealed."""
+        row, col = pos
+        return self.__board_state[row][col] == " " and pos not in self.__mark and pos not in self.__safe
+
     def __choose_pos(self) -> tuple:
         """Return the position of cell to be chosen and whether we mark it as bad cell or not.
         Return: ((row, col), mark)"""
-        if self.__mark: # Prioritize marking bad cells
+        if self.__mark and not (self.__reveal_order == "info" and self.__safe): # Prioritize marking bad cells unless revealing tells more
             pos = self.__mark.pop(0)
             logger.info(f"Marking cell {pos}...")
             return pos, True
@@ -324,22 +516,31 @@ class Solver:
         logger.warning(f"Cell {random_cell} was randomly chosen.")
         return random_cell, False
 
+    def __sort_safe_cells(self):
+        """Sort the safe cells so that the ones telling the most once revealed come first. Cells certain to be 0 come first
+        since the game then opens the whole area around them, then cells with the most unrevealed neighbors not known yet."""
+        pending = set(self.__safe) | set(self.__mark)
+
+        def score(pos: tuple) -> tuple:
+            neighbors = self.__neighbors(*pos)
+            unknown = sum(value == " " and neighbor not in pending for neighbor, value in neighbors.items())
+            is_zero = not unknown and "M" not in neighbors.values() and not any(neighbor in self.__mark for neighbor in neighbors)
+            return is_zero, unknown
+
+        self.__safe.sort(key=score, reverse=True) # Stable, so cells with the same score stay in the order they were found
+
     def __check_finished(self):
-        has_V = False
-        for row in self.__board_state:
-            if "V" in row: # Virus detected
-                has_V = True
-                self.__finished = True
-
-            if " " in row: # If we won (all cells are opened) then this case will never happen
-                if has_V:
-                    self.solved = False
-                    logger.critical("Fail to solve the problem.")
-                    return
+        if not any("V" in row for row in self.__board_state): # Viruses are only shown once the game is over
+            return
+        self.__finished = True
+
+        if any(" " in row for row in self.__board_state): # If we won (all cells are opened) then this case will never happen
+            self.solved = False
+            logger.critical("Fail to solve the problem.")
+            return
 
-        if has_V:
-            self.solved = True
-            logger.critical("Problem solved.")
+        self.solved = True
+        logger.critical("Problem solved.")
 
     def __board_has_zero(self):
         for row in self.__board_state:
@@ -348,8 +549,13 @@ class Solver:
                     return True
         return False
 
-    def __solve_as_csp(self):
+    def __solve_as_csp(self, timeout = None):
+        from ortools.sat.python import cp_model
+        import csp
+
         # CpSolver is stateless, no need to create a new one in every function call.
+        if self.__cp_solver is None:
+            self.__cp_solver = cp_model.CpSolver()
         
         if self.__board_has_zero():
             pass
@@ -357,14 +563,15 @@ class Solver:
             logger.warning("Not enough context!")
             return "UNKNOWN"
         
-        timeout = self.__csp_timeout
+        if timeout is None:
+            timeout = self.__csp_timeout
         if timeout:
-            self.__cp_solver.parameters.max_time_in_seconds = self.__csp_timeout
+            self.__cp_solver.parameters.max_time_in_seconds = timeout
             print(f"Trying to use CpSolver (time limit: {timeout}s)...")
         else:
             print(f"Trying to use CpSolver...")
         model, var, var_pos = self.__create_cp_variables()
-        res = util.CSPSolution(variables=var, time_limit=self.__csp_timeout)
+        res = csp.CSPSolution(variables=var, time_limit=timeout)
         logger.info("Preparing to use CpSolver...")
         status = self.__cp_solver.SearchForAllSolutions(model, res)
         logger.info(f"Found {len(res.solution_list)} solutions.")
@@ -372,12 +579,17 @@ class Solver:
             logger.warning("No solution found!")
             return status
         
-        if res.timeout and self.__min_num_sol_cp_solver is not None and len(res.solution_list < self.__min_num_sol_cp_solver):
+        if res.timeout and self.__min_num_sol_cp_solver is not None and len(res.solution_list) < self.__min_num_sol_cp_solver:
             logger.warning("Aborting...")
             return "TIMEOUT"
 
-        first_row = res.solution_list[0]
-        for case in res.solution_list:
+        self.__add_csp_cells(res.solution_list, var_pos)
+        return status
+
+    def __add_csp_cells(self, solution_list: list, var_pos: list):
+        """Add cells having the same value in every solution to the list of cells to be marked or revealed."""
+        first_row = list(solution_list[0])
+        for case in solution_list:
             for idx, val in enumerate(first_row):
                 if val != case[idx]: # If a cell contains 2 different values in 2 different cases then we cannot be sure about it
                     first_row[idx] = -1 # -1 acts as a flag to skip
@@ -387,16 +599,261 @@ class Solver:
                 continue
 
             pos = var_pos[idx]
+            if not self.__is_new_cell(pos):
+                continue
             
-            if val == 1 and pos not in self.__mark: # 1 means that cell contains a virus
+            if val == 1: # 1 means that cell contains a virus
                 self.__mark.append(pos)
                 logger.info(f"Cell {pos} with {val=} was determined as containing virus from CpSolver")
 
-            elif val == 0 and pos not in self.__safe:
+            elif val == 0:
                 self.__safe.append(pos)
                 logger.info(f"Cell {pos} with {val=} was determined as safe to reveal from CpSolver")
-        
-        return status
+
+    def __frontier_size(self) -> int:
+        """Return the number of unrevealed cells adjacent to the border, i.e. the number of variables of the heavy tiers."""
+        frontier = set()
+        for row, col in self.__border:
+            for pos, value in self.__neighbors(row, col).items():
+                if value == " ":
+                    frontier.add(pos)
+        return len(frontier)
+
+    def __remaining_budget(self, move_start: float):
+        """Return the number of seconds left for the current move or None if there is no move budget."""
+        if self.__move_budget is None:
+            return None
+        return self.__move_budget - (time.time() - move_start)
+
+    def __cp_timeout(self, remaining):
+        """Return CpSolver's time limit given the remaining budget of the current move."""
+        timeout = self.__csp_timeout
+        if remaining is not None:
+            timeout = remaining if not timeout else min(timeout, remaining)
+        return timeout
+
+    def __schedule_tiers(self, frontier_size: int, remaining) -> list:
+        """Return the heavy tiers worth trying for the current move, in the order they should be tried.
+
+        Without a move budget, tiers are tried in fixed order. Otherwise a tier is skipped if its hit rate in this run is
+        too low or if its predicted run time on the current frontier exceeds the remaining budget, and the other tiers
+        are ordered by their expected number of hits per second. A tier skipped for its hit rate is tried again every
+        `tier_retry_interval` moves, since its hit rate would otherwise never change."""
+        tiers = []
+        if self.__use_least_square:
+            tiers.append("least_square")
+        if self.__use_model_counting:
+            tiers.append("counting")
+        elif self.__use_cp_solver:
+            tiers.append("cp")
+
+        if remaining is None:
+            return tiers
+
+        scheduled = []
+        for tier in tiers:
+            stats = self.__tier_stats[tier]
+            hit_rate = (stats["hits"] + 1) / (stats["attempts"] + 2) # Laplace smoothing so that untried tiers still get a chance
+            cost = stats["time"] / stats["num_vars"] * frontier_size if stats["num_vars"] else 0
+
+            if hit_rate < self.__min_tier_hit_rate:
+                stats["skipped"] += 1 # Reset once the tier runs
+                if self.__tier_retry_interval is None or stats["skipped"] < self.__tier_retry_interval:
+                    logger.info(f"Skipping {tier} tier: hit rate {hit_rate:.2f} is too low.")
+                    continue
+                logger.info(f"Retrying {tier} tier: it was skipped for {stats['skipped'] - 1} moves.")
+            # CpSolver can be stopped early by its time limit so it is only skipped when there is no time left
+            if cost > remaining and tier != "cp":
+                logger.info(f"Skipping {tier} tier: predicted time {cost:.3f}s exceeds remaining budget {remaining:.3f}s.")
+                continue
+            scheduled.append((hit_rate / max(cost, 10**-6), tier))
+
+        scheduled.sort(reverse=True)
+        return [tier for _, tier in scheduled]
+
+    def __run_tier(self, tier: str, frontier_size: int, remaining) -> bool:
+        """Run a heavy tier, record its statistics and return whether it found any cell to mark or reveal."""
+        start = time.time()
+        if tier == "least_square":
+            self.__solve_with_least_square()
+        elif tier == "cp":
+            self.__solve_as_csp(timeout=self.__cp_timeout(remaining))
+        elif tier == "counting":
+            self.__solve_by_counting()
+
+        hit = bool(self.__safe or self.__mark)
+        stats = self.__tier_stats[tier]
+        stats["attempts"] += 1
+        stats["hits"] += int(hit)
+        stats["time"] += time.time() - start
+        stats["num_vars"] += frontier_size
+        stats["skipped"] = 0
+        return hit
+
+    def __run_tiers(self, move_start: float) -> bool:
+        """Try the heavy tiers within the move budget. Return whether any of them found a cell to mark or reveal."""
+        frontier_size = self.__frontier_size()
+        for tier in self.__schedule_tiers(frontier_size, self.__remaining_budget(move_start)):
+            remaining = self.__remaining_budget(move_start)
+            if remaining is not None and remaining <= 0:
+                logger.warning("Move budget exhausted. Falling back to a guess.")
+                return False
+            if self.__run_tier(tier, frontier_size, remaining):
+                return True
+        return False
+
+    def __frontier_constraints(self) -> list:
+        """Return the constraints given by the border as a list of (unrevealed neighbors, number of viruses among them) pairs."""
+        constraints = []
+        for row, col in self.__border:
+            neighbors = self.__neighbors(row, col)
+            unknown = [pos for pos, value in neighbors.items() if value == " "]
+            count_marked = sum(value == "M" for value in neighbors.values())
+            constraints.append((unknown, int(self.__board_state[row][col]) - count_marked))
+        return constraints
+
+    def __solve_by_counting(self, guess: bool = False) -> bool:
+        """Count every configuration of the unrevealed cells that is consistent with the board and the number of viruses left.
+        Cells having the same value in every configuration are marked or revealed. If there is no such cell and `guess` is True,
+        the cell least likely to contain a virus is revealed. Return False if no configuration is consistent with the board."""
+        constraints = self.__frontier_constraints()
+        frontier = {pos for cells, _ in constraints for pos in cells}
+        interior = [pos for pos in self.__undiscovered if pos not in frontier] # Cells that no number tells anything about
+
+        density = self.__game.density if self.__windowed else None # The number of viruses left in the window is unknown
+        probabilities, interior_probability = counting.probabilities(constraints, len(interior), self.__num_virus_left, density)
+        if probabilities is None:
+            logger.warning("No configuration is consistent with the board!")
+            return False
+
+        for pos in interior:
+            probabilities[pos] = interior_probability
+
+        for pos, probability in probabilities.items():
+            if not self.__is_new_cell(pos):
+                continue
+            if probability == 1:
+                self.__mark.append(pos)
+                logger.info(f"Cell {pos} was determined as containing virus from counting all configurations")
+            elif probability == 0:
+                self.__safe.append(pos)
+                logger.info(f"Cell {pos} was determined as safe to reveal from counting all configurations")
+
+        if guess and not (self.__mark or self.__safe):
+            row, col = min(probabilities, key=probabilities.get)
+            logger.warning(f"Cell {(row, col)} was chosen with virus probability {float(probabilities[(row, col)]):.3f}.")
+            self.__write_command(row=row, col=col, mark=False)
+        return True
+
+    def __frontier_components(self) -> list:
+        """Split the border into groups of cells such that two groups share no unrevealed neighbor.
+        Each group can then be solved independently."""
+        components = [] # A list of (border cells, unrevealed neighbors)
+        for row, col in self.__border:
+            cells = [(row, col)]
+            unknown = {pos for pos, value in self.__neighbors(row, col).items() if value == " "}
+            for component in components[:]:
+                if component[1] & unknown: # Share an unrevealed neighbor so they must be solved together
+                    cells.extend(component[0])
+                    unknown |= component[1]
+                    components.remove(component)
+            components.append((cells, unknown))
+        return [cells for cells, _ in components]
+
+    def __search_all_solutions(self, model, callback):
+        """Find all solutions of `model` with the CpSolver of `callback`. Called from a worker thread."""
+        if callback.cancelled: # Cancelled before a thread was free to run it
+            return None
+        return callback.cp_solver.SearchForAllSolutions(model, callback)
+
+    async def __solve_async(self, timeout) -> bool:
+        """Run least square and CpSolver in background threads and write cells to the game as soon as they are proven.
+        Each independent part of the border gets its own CpSolver. After cells are written, parts of the border touched by
+        the new board are cancelled and solved again. Return whether any cell was written."""
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        tasks = {} # future -> (tier, callback or None, variable positions)
+        cancelled = {} # future -> callback of CpSolvers cancelled because the board changed
+        found = False
+
+        def submit_components(components):
+            from ortools.sat.python import cp_model
+            import csp
+
+            for border in components:
+                model, var, var_pos = self.__create_cp_variables(border)
+                cp_solver = cp_model.CpSolver()
+                cp_solver.parameters.num_workers = 1 # Components already run in parallel
+                if timeout:
+                    cp_solver.parameters.max_time_in_seconds = timeout
+                callback = csp.CSPSolution(variables=var, time_limit=timeout, cp_solver=cp_solver)
+                future = loop.run_in_executor(executor, self.__search_all_solutions, model, callback)
+                tasks[future] = ("cp", callback, var_pos)
+
+        if self.__use_least_square:
+            var, param, target = self.__create_linear_system_vars()
+            future = loop.run_in_executor(executor, lambda: np.linalg.lstsq(param, target, rcond=None)[0])
+            tasks[future] = ("least_square", None, var)
+
+        if self.__use_cp_solver and self.__board_has_zero():
+            submit_components(self.__frontier_components())
+
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    tier, callback, var_pos = tasks.pop(future)
+                    if tier == "least_square":
+                        self.__add_least_square_cells(var_pos, future.result())
+                        continue
+
+                    future.result()
+                    if not callback.solution_list:
+                        continue
+                    if callback.timeout and self.__min_num_sol_cp_solver is not None and len(callback.solution_list) < self.__min_num_sol_cp_solver:
+                        continue
+                    self.__add_csp_cells(callback.solution_list, var_pos)
+
+                if not (self.__mark or self.__safe):
+                    continue
+
+                found = True
+                old_board = [row[:] for row in self.__board_state] # The board is changed in place by commands sent to a game in this process
+                self.__write_all_possible()
+                self.__read_board()
+
+                self.__check_finished()
+                if self.__finished:
+                    break
+
+                changed = [(row, col) for row, cells in enumerate(old_board) for col, cell in enumerate(cells) if self.__board_state[row][col] != cell]
+                touched = set(changed)
+                for row, col in changed:
+                    touched.update(self.__neighbors(row, col))
+
+                # Parts of the border whose cells were touched got new constraints, solve them again on the new board
+                for future, (tier, callback, var_pos) in list(tasks.items()):
+                    if tier == "cp" and touched & set(var_pos):
+                        callback.cancel()
+                        cancelled[future] = callback
+                        del tasks[future]
+                        logger.info(f"Restarting CpSolver on {len(var_pos)} cells changed by the board.")
+
+                if self.__use_cp_solver:
+                    self.__find_cells_in_border()
+                    components = [border for border in self.__frontier_components()
+                                  if any(pos in touched for cell in border for pos in self.__neighbors(*cell))]
+                    submit_components(components)
+        finally:
+            cancelled.update((future, callback) for future, (tier, callback, var_pos) in tasks.items() if callback is not None)
+            pending = {future for future in cancelled if not future.done()}
+            while pending: # A search that had not started when it was cancelled is stopped once it starts
+                for callback in cancelled.values():
+                    callback.cancel()
+                _, pending = await asyncio.wait(pending, timeout=0.01)
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        return found
 
     def solve(self):
         self.__iter = 0
@@ -409,6 +866,7 @@ class Solver:
             logger.info(f"Iteration {self.__iter} started")
 
             self.__read_board()
+            move_start = time.time()
             
             self.__check_finished()
             if self.__finished:
@@ -420,24 +878,21 @@ class Solver:
             self.__find_safe_cells()
             
             if self.__safe or self.__mark:
-                while self.__mark or self.__safe:
-                    self.__write_command()
+                self.__write_all_possible()
                 continue # Codes below are used if we cannot use logic
 
-            if self.__border and self.__use_least_square:
-                self.__solve_with_least_square()
-
-                if self.__safe or self.__mark:
-                    while self.__mark or self.__safe:
-                        self.__write_command()
-                    continue # Codes below are used if we cannot use least square
-                
-            if self.__border and self.__use_cp_solver:
-                self.__solve_as_csp()
-                if self.__safe or self.__mark:
-                    while self.__mark or self.__safe:
-                        self.__write_command()
-                    continue # Codes below are used to choose a random cell to open, which is redundant if we flagged or opened a cell in current iteration
+            if self.__endgame_threshold is not None and len(self.__undiscovered) <= self.__endgame_threshold and not self.__windowed:
+                if self.__solve_by_counting(guess=True):
+                    self.__write_all_possible()
+                    continue # Counting is exact so there is no need for the other tiers
+
+            if self.__border and self.__use_async_solver and not self.__use_model_counting and not self.__windowed: # The window may move while solving
+                if asyncio.run(self.__solve_async(self.__cp_timeout(self.__remaining_budget(move_start)))):
+                    continue # Cells were written while solving
+
+            elif self.__border and self.__run_tiers(move_start):
+                self.__write_all_possible()
+                continue # Codes below are used to choose a random cell to open, which is redundant if we flagged or opened a cell in current iteration
 
             self.__check_finished()
             if self.__finished:
@@ -446,6 +901,11 @@ class Solver:
             # A random cell
             self.__write_command()
         
+        logger.info(f"Tier statistics: {self.__tier_stats}")
+
+        if self.__shared_board is not None:
+            self.__shared_board.close()
+
         if self.result_path is not None:
             with open(self.result_path, 'a') as res_file:
                 res_file.write(f"{int(self.solved)}\n")
@@ -459,6 +919,15 @@ def main():
                     use_cp_solver = config.use_cp_solver,
                     csp_timeout = config.timeout,
                     min_num_sol_cp_solver = config.min_num_sol_cp_solver,
+                    move_budget = config.move_budget,
+                    use_async_solver = config.use_async_solver,
+                    use_model_counting = config.use_model_counting,
+                    endgame_threshold = config.endgame_threshold,
+                    min_tier_hit_rate = config.min_tier_hit_rate,
+                    tier_retry_interval = config.tier_retry_interval,
+                    reveal_order = config.reveal_order,
+                    defer_marks = config.defer_marks,
+                    shared_board_name = config.shared_board_name,
                     wait=config.wait)
 
     solver.solve()
@@ -0,0 +1,53 @@
+import random
+
+import numpy as np
+import pytest
+
+import chunked
+import solver
+
+
+def test_values_match_whole_board():
+    board = chunked.ChunkedBoard(board_size=50, density=0.2, seed=3, tile_size=16)
+    size = board.num_tiles * 16
+    viruses = np.zeros((size, size), dtype=bool)
+    values = np.zeros((size, size), dtype=int)
+    for tile_row in range(board.num_tiles):
+        for tile_col in range(board.num_tiles):
+            viruses[tile_row * 16:(tile_row + 1) * 16, tile_col * 16:(tile_col + 1) * 16] = board.viruses(tile_row, tile_col)
+            values[tile_row * 16:(tile_row + 1) * 16, tile_col * 16:(tile_col + 1) * 16] = board.values(tile_row, tile_col)
+    viruses, values = viruses[:50, :50], values[:50, :50]
+
+    for row in range(50):
+        for col in range(50):
+            expected = -1 if viruses[row, col] else viruses[max(row - 1, 0):row + 2, max(col - 1, 0):col + 2].sum()
+            assert values[row, col] == expected
+
+
+def test_solved_tiles_are_dropped():
+    covid_game = chunked.ChunkedCovidGame(board_size=128, density=0.15, seed=0, tile_size=8)
+    num_tiles = covid_game.board.num_tiles
+    max_kept = 0
+    for tile_row in range(num_tiles): # Reveal every safe cell, one row of tiles after the other
+        for tile_col in range(num_tiles):
+            values = covid_game.board.values(tile_row, tile_col)
+            for row, col in np.argwhere(values != -1).tolist():
+                covid_game.step([str(tile_row * 8 + row + 1), str(tile_col * 8 + col + 1)])
+            max_kept = max(max_kept, len(covid_game.tiles))
+
+        if tile_row + 1 < num_tiles:
+            first_row, _, board = covid_game.window()
+            assert first_row >= (tile_row - 1) * 8 # Rows of solved tiles behind the frontier are not read again
+
+    assert covid_game.won and not covid_game.tiles
+    assert max_kept <= 3 * num_tiles # Only the tiles around the current row are kept
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_solver_on_chunked_board(seed):
+    random.seed(seed)
+    covid_game = chunked.ChunkedCovidGame(board_size=40, density=0.12, seed=seed, tile_size=8)
+    covid_solver = solver.Solver(game=covid_game, use_model_counting=True, use_least_square=True)
+    covid_solver.solve()
+    assert covid_game.over
+    assert covid_solver.solved == covid_game.won
@@ -0,0 +1,87 @@
+import random
+import itertools
+from fractions import Fraction
+from math import comb
+
+import pytest
+
+import counting
+
+
+def random_constraints(rng: random.Random, consistent: bool = True) -> tuple:
+    """Constraints looking like a border: numbers next to a few unrevealed cells on a small grid.
+    Return (constraints, number of viruses placed among the cells)."""
+    cells = rng.sample([(row, col) for row in range(4) for col in range(4)], rng.randint(1, 9))
+    viruses = {cell for cell in cells if rng.random() < 0.35}
+    constraints = []
+    for _ in range(rng.randint(1, 6)):
+        center = (rng.randint(-1, 4), rng.randint(-1, 4))
+        neighbors = [cell for cell in cells if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) == 1]
+        if neighbors:
+            value = len(viruses & set(neighbors))
+            constraints.append((neighbors, value if consistent else rng.randint(0, len(neighbors))))
+    return constraints, len(viruses)
+
+
+def brute_force(constraints: list, num_interior: int, num_virus: int, density = None) -> tuple:
+    """Same as `counting.probabilities` by enumerating every configuration of the variables."""
+    variables = sorted({cell for cells, _ in constraints for cell in cells})
+    weight = 0
+    numerators = dict.fromkeys(variables, 0)
+    interior_numerator = 0
+    for values in itertools.product((0, 1), repeat=len(variables)):
+        config = dict(zip(variables, values))
+        if any(sum(config[cell] for cell in cells) != value for cells, value in constraints):
+            continue
+        total = sum(values)
+        if density is not None:
+            config_weight = density ** total * (1 - density) ** (len(variables) - total)
+        else:
+            config_weight = comb(num_interior, num_virus - total) if num_virus >= total else 0
+            if num_interior and num_virus > total:
+                interior_numerator += comb(num_interior - 1, num_virus - total - 1)
+        weight += config_weight
+        for var in variables:
+            numerators[var] += config[var] * config_weight
+
+    if weight == 0:
+        return None, None
+    interior = density if density is not None else (Fraction(interior_numerator, weight) if num_interior else None)
+    return {var: Fraction(numerator, 1) / weight for var, numerator in numerators.items()}, interior
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_count_component(seed):
+    rng = random.Random(seed)
+    constraints, _ = random_constraints(rng, consistent=seed % 4 != 0)
+    for variables, group in counting.split_components(constraints):
+        counts, cell_counts = counting.count_component(variables, group)
+        expected = {}
+        expected_cells = {}
+        for values in itertools.product((0, 1), repeat=len(variables)):
+            config = dict(zip(variables, values))
+            if all(sum(config[cell] for cell in cells) == value for cells, value in group):
+                total = sum(values)
+                expected[total] = expected.get(total, 0) + 1
+                expected_cells.setdefault(total, [0] * len(variables))
+                for idx, value in enumerate(values):
+                    expected_cells[total][idx] += value
+        assert {total: count for total, count in counts.items() if count} == expected
+        assert {total: cells for total, cells in cell_counts.items() if total in expected} == expected_cells
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_probabilities_with_number_of_viruses(seed):
+    rng = random.Random(seed)
+    constraints, num_frontier_virus = random_constraints(rng, consistent=seed % 4 != 0)
+    num_interior = rng.randint(0, 6)
+    num_virus = num_frontier_virus + rng.randint(0, num_interior) if seed % 5 else rng.randint(0, 8)
+    assert counting.probabilities(constraints, num_interior, num_virus) == brute_force(constraints, num_interior, num_virus)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_probabilities_with_density(seed):
+    rng = random.Random(seed)
+    constraints, _ = random_constraints(rng, consistent=seed % 4 != 0)
+    density = Fraction(rng.randint(1, 9), 10)
+    assert counting.probabilities(constraints, 0, 0, density) == brute_force(constraints, 0, 0, density)
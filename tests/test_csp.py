@@ -0,0 +1,29 @@
+import time
+import random
+import threading
+
+from ortools.sat.python import cp_model
+
+import csp
+
+
+def test_cancel_stops_running_search():
+    rng = random.Random(0)
+    model = cp_model.CpModel()
+    variables = [model.NewBoolVar(f"{idx}") for idx in range(30)]
+    weights = [rng.randrange(10**12, 10**13) for _ in variables]
+    model.Add(sum(weight * var for weight, var in zip(weights, variables)) == sum(weights) // 2) # Slow to solve, even partially
+
+    cp_solver = cp_model.CpSolver()
+    cp_solver.parameters.num_workers = 1
+    cp_solver.parameters.max_time_in_seconds = 30
+    callback = csp.CSPSolution(variables=variables, time_limit=30, cp_solver=cp_solver)
+    thread = threading.Thread(target=cp_solver.SearchForAllSolutions, args=(model, callback))
+    thread.start()
+    time.sleep(0.2)
+
+    start = time.time()
+    callback.cancel()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert time.time() - start < 1
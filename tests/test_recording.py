@@ -0,0 +1,49 @@
+import os
+
+import game
+import recording
+
+VIRUS_POSITIONS = [(4, 4), (4, 5), (5, 4), (6, 6), (2, 7), (7, 1), (8, 8), (0, 8), (3, 2), (6, 3)]
+COMMANDS = [["1", "1"], ["9", "1"], ["3", "8", "M"], ["5", "5"]] # The last one reveals a virus
+
+
+def record(path) -> game.CovidGame:
+    covid_game = game.CovidGame(board_size=9, num_virus=len(VIRUS_POSITIONS), headless=True, virus_positions=VIRUS_POSITIONS,
+                                record_path=str(path))
+    for command in COMMANDS:
+        covid_game.step(command)
+    return covid_game
+
+
+def test_check(tmp_path):
+    covid_game = record(tmp_path / "game.rec")
+    assert covid_game.over
+    assert covid_game.recorder is None # Closed once the game is over
+    assert recording.check(str(tmp_path / "game.rec"))
+
+
+def test_every_game_is_recorded_to_its_own_file(tmp_path):
+    paths = []
+    for _ in range(3):
+        paths.append(recording.numbered_path(str(tmp_path / "game.rec")))
+        record(paths[-1])
+    assert [os.path.basename(path) for path in paths] == ["game-1.rec", "game-2.rec", "game-3.rec"]
+    assert all(recording.check(path) for path in paths)
+
+
+def test_new_game_in_recorded_position(tmp_path):
+    record(tmp_path / "game.rec")
+    expected = game.CovidGame(board_size=9, num_virus=len(VIRUS_POSITIONS), headless=True, virus_positions=VIRUS_POSITIONS)
+    for num_commands, command in enumerate(COMMANDS):
+        covid_game, records = recording.new_game(str(tmp_path / "game.rec"), num_commands)
+        assert len(records) == len(COMMANDS)
+        assert covid_game.virus_values == expected.virus_values
+        assert not covid_game.over
+        expected.step(command)
+
+
+def test_replay_from_recorded_position(tmp_path):
+    record(tmp_path / "game.rec")
+    solved, num_commands, _ = recording.replay(str(tmp_path / "game.rec"), num_commands=len(COMMANDS) - 1,
+                                               use_model_counting=True, endgame_threshold=20, first_pos=(4, 4))
+    assert solved and num_commands > 1 # first_pos is a virus, so it must not be revealed again
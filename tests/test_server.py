@@ -0,0 +1,89 @@
+import json
+import socket
+import asyncio
+
+import pytest
+
+import server
+
+
+def test_reveal_on_large_empty_board():
+    game_server = server.GameServer()
+    game_id = game_server.create(board_size=60, num_virus=1, seed=0)["game"]
+    values = game_server.session(game_id).game.values
+    row, col = next((row, col) for row in range(60) for col in range(60) if values[row][col] == 0)
+    response = game_server.dispatch({"op": "reveal", "game": game_id, "row": row, "col": col})
+    assert response["over"] # Every safe cell is opened at once
+    assert len(response["changes"]) == 60 * 60
+    assert "".join(game_server.state(game_id)["board"]).count(" ") == 0
+
+
+def test_create_rejects_large_boards():
+    game_server = server.GameServer(max_board_size=20)
+    for board_size, num_virus in [(21, 10), (0, 0), (5, 26), (5, -1)]:
+        with pytest.raises(ValueError):
+            game_server.create(board_size=board_size, num_virus=num_virus)
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs unix sockets")
+def test_errors_keep_the_connection(tmp_path, monkeypatch):
+    def dispatch(self, request):
+        if request["op"] == "crash":
+            raise RuntimeError("unexpected")
+        return original(self, request)
+    original = server.GameServer.dispatch
+    monkeypatch.setattr(server.GameServer, "dispatch", dispatch)
+
+    async def run():
+        game_server = server.GameServer()
+        listener = await asyncio.start_unix_server(game_server.handle, path=str(tmp_path / "server.sock"))
+        async with listener:
+            reader, writer = await asyncio.open_unix_connection(str(tmp_path / "server.sock"))
+            responses = []
+            for request in [{"op": "crash"}, {"op": "create", "board_size": 1000, "num_virus": 1}, {"op": "create", "board_size": 9, "num_virus": 10}]:
+                writer.write(json.dumps(request).encode() + b"\n")
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+            return responses
+
+    crash, too_large, created = asyncio.run(run())
+    assert not crash["ok"] and "unexpected" in crash["error"]
+    assert not too_large["ok"]
+    assert created["ok"] and created["game"] == 1
+
+
+def test_delta_after_history_is_trimmed():
+    game_server = server.GameServer(max_history=10)
+    game_id = game_server.create(board_size=20, num_virus=100, seed=0)["game"]
+    session = game_server.session(game_id)
+    all_changes = []
+    for row in range(20):
+        for col in range(20):
+            if not session.game.over and session.game.values[row][col] > 0:
+                iter = session.game.iter + 1
+                all_changes.extend([iter] + change for change in game_server.moves(game_id, [[row, col]])["changes"])
+    assert len(session.history) <= 20 # Bounded by twice max_history
+    assert session.dropped > 0
+
+    for since in (session.dropped, session.dropped + 3, session.game.iter):
+        assert game_server.delta(game_id, since)["changes"] == [change for change in all_changes if change[0] > since]
+    with pytest.raises(ValueError):
+        game_server.delta(game_id, session.dropped - 1)
+
+
+def test_unused_games_expire():
+    game_server = server.GameServer(session_timeout=10)
+    old_id = game_server.create(board_size=9, num_virus=10)["game"]
+    new_id = game_server.create(board_size=9, num_virus=10)["game"]
+    game_server.session(old_id).last_used -= 11
+    game_server.expire()
+    assert list(game_server.sessions) == [new_id]
+
+
+def test_create_does_not_log_the_board(caplog):
+    game_server = server.GameServer()
+    with caplog.at_level("INFO"):
+        for _ in range(10):
+            game_server.create(board_size=9, num_virus=10)
+    assert not caplog.records
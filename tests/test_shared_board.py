@@ -0,0 +1,119 @@
+import os
+import random
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import game
+import shared_board
+import solver
+
+
+@pytest.fixture
+def name(request):
+    return f"test_{os.getpid()}_{request.node.name}"[:30] # Names are limited in length on some platforms
+
+
+def test_write_read_round_trip(name):
+    board = shared_board.SharedBoard.create(name, 7)
+    reader = shared_board.SharedBoard.attach(name)
+    codes = np.random.default_rng(0).integers(0, 12, (7, 7)).astype(np.uint8)
+    board.write(codes, 3, 5)
+
+    iter, num_virus_left, cells = reader.read()
+    assert (iter, num_virus_left) == (3, 5)
+    assert np.array_equal(cells, codes)
+    board.write(np.zeros((7, 7), dtype=np.uint8), 4, 5)
+    assert np.array_equal(cells, codes) # A snapshot is not changed by later writes
+    reader.close()
+    board.close()
+
+
+def test_read_waits_while_the_game_is_writing(name):
+    board = shared_board.SharedBoard.create(name, 4)
+    reader = shared_board.SharedBoard.attach(name)
+    board.header[shared_board.SEQUENCE] += 1 # Start writing
+    board.cells[:] = 1
+    board.header[shared_board.ITER] = 1
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(reader.read()))
+    thread.start()
+    time.sleep(0.05)
+    assert thread.is_alive() # The sequence is odd so the read is retried
+    board.cells[:] = 2
+    board.header[shared_board.SEQUENCE] += 1 # Done writing
+    thread.join(timeout=1)
+    assert result[0][0] == 1
+    assert np.all(result[0][2] == 2)
+    reader.close()
+    board.close()
+
+
+def test_stale_board_is_closed_and_attached_again(name):
+    stale = shared_board.SharedBoard.create(name, 4)
+    reader = shared_board.SharedBoard.attach(name)
+    assert not reader.closed
+    board = shared_board.SharedBoard.create(name, 6) # A new game with the same name
+    assert reader.closed
+    reader.close()
+    reader = shared_board.SharedBoard.attach(name)
+    assert reader.cells.shape == (6, 6)
+    reader.close()
+    board.close()
+    del stale # Already removed by the new game
+
+
+def test_solver_attaches_to_the_new_board(name):
+    stale = shared_board.SharedBoard.create(name, 4)
+    stale.write(np.full((4, 4), shared_board.HIDDEN, dtype=np.uint8), 5, 2)
+    covid_solver = solver.Solver(shared_board_name=name)
+    covid_solver._Solver__shared_board = shared_board.SharedBoard.attach(name)
+
+    covid_game = game.CovidGame(board_size=6, num_virus=3, headless=True, shared_board_name=name, virus_positions=[(0, 0), (1, 1), (2, 2)])
+    covid_game.creat_board()
+    covid_solver._Solver__read_board()
+    assert len(covid_solver._Solver__board_state) == 6
+    covid_solver._Solver__shared_board.close()
+    covid_game.shared_board.close()
+
+
+def test_close_removes_the_board(name):
+    board = shared_board.SharedBoard.create(name, 4)
+    reader = shared_board.SharedBoard.attach(name)
+    board.close()
+    assert reader.closed
+    reader.close()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_read_matches_the_board_file(name, seed):
+    random.seed(seed)
+    cells = random.sample(range(12 * 12), 20)
+    covid_game = game.CovidGame(board_size=12, num_virus=20, headless=True, board_filepath="board.out",
+                                shared_board_name=name, virus_positions=[divmod(cell, 12) for cell in cells])
+    file_solver = solver.Solver(path_to_board="board.out")
+    shared_solver = solver.Solver(shared_board_name=name)
+    for idx, cell in enumerate(random.sample(range(12 * 12), 60)):
+        if cell in cells[:5]: # Found but not marked in the game
+            for covid_solver in (file_solver, shared_solver):
+                covid_solver._Solver__deferred_marks.add(divmod(cell, 12))
+        elif cell in cells[5:10]:
+            covid_game.step([str(cell // 12 + 1), str(cell % 12 + 1), "M"])
+        elif cell not in cells:
+            covid_game.step([str(cell // 12 + 1), str(cell % 12 + 1)])
+        covid_game.to_csv()
+        covid_game.shared_board.write(covid_game.codes, covid_game.iter, covid_game.num_virus_left)
+
+        for covid_solver in (file_solver, shared_solver):
+            covid_solver._Solver__iter = covid_game.iter
+            covid_solver._Solver__read_board()
+        for attribute in ("board_state", "virus_map", "undiscovered", "num_virus_left"):
+            assert getattr(shared_solver, f"_Solver__{attribute}") == getattr(file_solver, f"_Solver__{attribute}")
+    shared_solver._Solver__shared_board.close()
+    covid_game.shared_board.close()
@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+
+import pytest
+
+import game
+import solver
+
+VIRUS_POSITIONS = [(4, 4), (4, 5), (5, 4), (6, 6), (2, 7), (7, 1), (8, 8), (0, 8), (3, 2), (6, 3)]
+
+
+def new_game(virus_positions=VIRUS_POSITIONS, board_size=9):
+    return game.CovidGame(board_size=board_size, num_virus=len(virus_positions), headless=True, virus_positions=virus_positions)
+
+
+def test_cp_tier_before_least_square():
+    covid_game = new_game()
+    covid_game.step(["1", "1"]) # Opens the area around the top left corner
+    covid_solver = solver.Solver(game=covid_game, use_least_square=True, use_cp_solver=True, csp_timeout=5)
+    covid_solver._Solver__read_board()
+    covid_solver._Solver__find_cells_in_border()
+
+    frontier_size = covid_solver._Solver__frontier_size()
+    covid_solver._Solver__run_tier("cp", frontier_size, None)
+    covid_solver._Solver__run_tier("least_square", frontier_size, None)
+    assert all(value in (0, 1) for row in covid_solver._Solver__virus_map for value in row)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_scheduled_cp_first(monkeypatch, seed):
+    monkeypatch.setattr(solver.Solver, "_Solver__schedule_tiers", lambda self, frontier_size, remaining: ["cp", "least_square"])
+    random.seed(seed)
+    cells = random.sample(range(81), 10)
+    covid_game = new_game([divmod(cell, 9) for cell in cells])
+    covid_solver = solver.Solver(game=covid_game, use_least_square=True, use_cp_solver=True, csp_timeout=5, move_budget=0.05)
+    covid_solver.solve()
+    assert covid_game.over
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_async_solver_stops_every_search(seed):
+    random.seed(seed)
+    cells = random.sample(range(16 * 16), 40)
+    covid_game = new_game([divmod(cell, 16) for cell in cells], board_size=16)
+    num_threads = threading.active_count()
+    covid_solver = solver.Solver(game=covid_game, use_least_square=True, use_cp_solver=True, csp_timeout=20,
+                                 use_async_solver=True, first_pos=(8, 8))
+    covid_solver.solve()
+    assert covid_game.over
+    assert threading.active_count() == num_threads # No CpSolver is left running after a move
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_endgame_marks_only_viruses(seed):
+    random.seed(seed)
+    cells = random.sample(range(81), 10)
+    covid_game = new_game([divmod(cell, 9) for cell in cells])
+    covid_solver = solver.Solver(game=covid_game, use_model_counting=True, endgame_threshold=81, first_pos=(4, 4))
+    covid_solver.solve()
+    assert covid_game.over
+    assert all(covid_game.values[row][col] == -1 for row, col in covid_game.marking)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_info_order_with_deferred_marks(seed):
+    random.seed(seed)
+    cells = random.sample(range(16 * 16), 40)
+    covid_game = new_game([divmod(cell, 16) for cell in cells], board_size=16)
+    covid_solver = solver.Solver(game=covid_game, use_model_counting=True, endgame_threshold=20, first_pos=(8, 8),
+                                 reveal_order="info", defer_marks=True)
+    covid_solver.solve()
+    assert covid_game.over
+    assert not covid_game.marking # Viruses are only kept by the solver
+    won = all(covid_game.virus_values[row][col] not in (" ", "M") for row in range(16) for col in range(16) if covid_game.values[row][col] != -1)
+    assert covid_solver.solved == won
+
+
+def test_info_order_does_not_read_the_board_for_every_command():
+    import chunked
+
+    random.seed(0)
+    covid_game = chunked.ChunkedCovidGame(board_size=64, density=0.1, seed=0, tile_size=8)
+    window = covid_game.window
+    num_reads = 0
+
+    def count_reads():
+        nonlocal num_reads
+        num_reads += 1
+        return window()
+    covid_game.window = count_reads
+
+    covid_solver = solver.Solver(game=covid_game, use_model_counting=True, reveal_order="info", defer_marks=True)
+    covid_solver.solve()
+    assert covid_game.over
+    assert num_reads < covid_game.iter / 2
+
+
+def scheduling_solver(**kwargs):
+    return solver.Solver(game=new_game(), use_least_square=True, use_model_counting=True, move_budget=1.0, **kwargs)
+
+
+def test_schedule_skips_tiers_with_low_hit_rate():
+    covid_solver = scheduling_solver(min_tier_hit_rate=0.2, tier_retry_interval=None)
+    covid_solver._Solver__tier_stats["least_square"].update(attempts=20, hits=0)
+    covid_solver._Solver__tier_stats["counting"].update(attempts=20, hits=10)
+    for _ in range(20):
+        assert covid_solver._Solver__schedule_tiers(10, 1.0) == ["counting"]
+
+
+def test_schedule_retries_skipped_tiers():
+    covid_solver = scheduling_solver(min_tier_hit_rate=0.2, tier_retry_interval=5)
+    covid_solver._Solver__tier_stats["least_square"].update(attempts=20, hits=0)
+    schedules = [covid_solver._Solver__schedule_tiers(10, 1.0) for _ in range(5)]
+    assert schedules[:4] == [["counting"]] * 4
+    assert "least_square" in schedules[4]
+    assert "least_square" in covid_solver._Solver__schedule_tiers(10, 1.0) # Until it actually runs
+
+    covid_solver._Solver__run_tier("least_square", 0, 1.0) # Nothing to find on an unread board
+    assert covid_solver._Solver__schedule_tiers(10, 1.0) == ["counting"]
+
+
+def test_schedule_skips_tiers_too_slow_for_the_budget():
+    covid_solver = solver.Solver(game=new_game(), use_least_square=True, use_cp_solver=True, move_budget=1.0)
+    covid_solver._Solver__tier_stats["least_square"].update(attempts=1, hits=1, time=1.0, num_vars=10) # 0.1s per variable
+    covid_solver._Solver__tier_stats["cp"].update(attempts=1, hits=1, time=1.0, num_vars=10)
+    assert covid_solver._Solver__schedule_tiers(5, 1.0) == ["least_square", "cp"]
+    assert covid_solver._Solver__schedule_tiers(20, 1.0) == ["cp"] # CpSolver is stopped by its time limit instead
+
+
+def test_schedule_orders_tiers_by_hits_per_second():
+    covid_solver = scheduling_solver()
+    covid_solver._Solver__tier_stats["least_square"].update(attempts=10, hits=5, time=0.1, num_vars=100)
+    covid_solver._Solver__tier_stats["counting"].update(attempts=10, hits=8, time=1.0, num_vars=100)
+    assert covid_solver._Solver__schedule_tiers(10, 1.0) == ["least_square", "counting"]
+    covid_solver._Solver__tier_stats["least_square"].update(time=10.0)
+    assert covid_solver._Solver__schedule_tiers(10, 100.0) == ["counting", "least_square"]
+
+
+def test_no_tier_runs_once_the_budget_is_exhausted(monkeypatch, caplog):
+    covid_solver = scheduling_solver()
+    run = []
+
+    def run_tier(self, tier, frontier_size, remaining):
+        run.append(tier)
+        time.sleep(1.0) # Uses up the budget without finding anything
+        return False
+    monkeypatch.setattr(solver.Solver, "_Solver__run_tier", run_tier)
+    with caplog.at_level("WARNING", logger="solver"):
+        assert not covid_solver._Solver__run_tiers(time.time()) # The solver then guesses
+    assert len(run) == 1
+    assert "Move budget exhausted" in caplog.text
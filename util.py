@@ -1,10 +1,3 @@
-import time
-import logging
-
-from ortools.sat.python import cp_model
-
-
-
 def neighbors(board, row: int, col: int) -> dict:
         """An other version of neighbors which allows passing custom board"""
         if row >= len(board) or col >= len(board[0]):
@@ -25,26 +18,7 @@ def neighbors(board, row: int, col: int) -> dict:
 
 def clear(*files):
     for filename in files:
+        if filename is None:
+            continue
         with open(filename, 'w') as file:
             file.write("")
-
-class CSPSolution(cp_model.CpSolverSolutionCallback):
-    def __init__(self,variables, time_limit = None):
-        self.__logger = logging.getLogger(name="solver")
-        self.__time_limit = time_limit
-        self.__start_time = time.time()
-        cp_model.CpSolverSolutionCallback.__init__(self)
-        self.__variables = variables
-        self.solution_list = [] # Solution List
-        self.timeout = False
-
-    def on_solution_callback(self):
-        if self.__time_limit:
-            if time.time() - self.__start_time > self.__time_limit:
-                if self.__logger:
-                    self.__logger.warning(f"Time limit exceeded. Got {len(self.solution_list)} solutions so far.")
-                self.timeout = True
-                self.StopSearch()
-        sol = [self.Value(v) for v in self.__variables]
-        if sol not in self.solution_list:
-            self.solution_list.append(sol)
\ No newline at end of file